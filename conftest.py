@@ -0,0 +1,10 @@
+import pytest
+from django.test.utils import override_settings
+
+
+@pytest.fixture(scope='session', autouse=True)
+def yatube_test_settings():
+    """Те же настройки, что у manage.py test (core.testing)."""
+    from core.testing import overrides
+    with override_settings(**overrides()):
+        yield
@@ -0,0 +1,48 @@
+from django.contrib import admin
+from django.utils.html import format_html
+
+from . import profiling
+from .models import RequestProfile, SlowQuery
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created', 'method', 'path', 'view_name', 'status',
+                    'duration_ms', 'kind', 'user')
+    list_filter = ('view_name', 'kind', 'created')
+    search_fields = ('path', 'view_name')
+    readonly_fields = ('created', 'user', 'method', 'path', 'view_name',
+                       'status', 'duration_ms', 'kind', 'file', 'summary')
+
+    def has_add_permission(self, request):
+        return False
+
+    def summary(self, obj):
+        return format_html('<pre>{}</pre>', profiling.summary(obj))
+    summary.short_description = 'Сводка'
+
+    def changelist_view(self, request, extra_context=None):
+        """Показывает персоналу токен, включающий профилирование."""
+        self.message_user(
+            request,
+            f'Профилировать запрос: ?_profile={profiling.token(request.user)}'
+            ' или заголовок X-Profile с тем же значением.')
+        return super().changelist_view(request, extra_context)
+
+
+admin.site.register(RequestProfile, RequestProfileAdmin)
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('fingerprint', 'view', 'count', 'total_ms', 'max_ms',
+                    'last_seen')
+    list_filter = ('view',)
+    search_fields = ('fingerprint',)
+    ordering = ('-total_ms',)
+    readonly_fields = ('digest', 'view', 'fingerprint', 'sample', 'plan',
+                       'count', 'total_ms', 'max_ms', 'last_seen')
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -0,0 +1,247 @@
+"""Двухуровневый кеш: LRU в памяти процесса перед общим кешем.
+
+Горячие ключи (первая страница index, группы, пользователи) читаются
+из памяти процесса без обращения к общему кешу. Локальная копия живёт
+не дольше LOCAL_TIMEOUT секунд. delete, incr и clear увеличивают
+поколение в общем кеше; процессы сверяют его не чаще раза в
+SYNC_INTERVAL секунд и при изменении сбрасывают свой уровень, поэтому
+сброс версии ленты (feed_cache.bump) доходит до всех воркеров.
+Ключи с префиксами из LOCAL_EXCLUDE (блокировки, счётчики метрик)
+работают только через общий кеш и поколение не меняют. Как и в
+LocMemCache, значения хранятся сериализованными: каждый get получает
+свою копию, и потоки не делят изменяемые объекты.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.layered.LayeredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'LOCAL_TIMEOUT': 5,
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_EXCLUDE': ('lock:',),
+            },
+        },
+        'shared': {...},
+    }
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core import metrics
+from core.timing import timed
+
+GENERATION_KEY = 'layered:generation'
+
+# Локальные уровни общие для всех потоков процесса, как у LocMemCache.
+_stores = {}
+_locks = {}
+
+
+def _count_reads(local=0, shared=0, miss=0):
+    for layer, result, amount in (('local', 'hit', local),
+                                  ('shared', 'hit', shared),
+                                  ('shared', 'miss', miss)):
+        if amount:
+            metrics.inc('yatube_cache_requests_total', amount,
+                        layer=layer, result=result)
+
+
+class _LocalStore:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.generation = None
+        self.checked_at = 0.0
+
+
+class LayeredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location or options.get('SHARED', 'shared')
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._local_max = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._sync_interval = float(options.get('SYNC_INTERVAL', 1))
+        self._exclude = tuple(options.get('LOCAL_EXCLUDE', ('lock:',)))
+        self._store = _stores.setdefault(self._shared_alias, _LocalStore())
+        self._lock = _locks.setdefault(self._shared_alias, threading.Lock())
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _version(self, version):
+        return self.version if version is None else version
+
+    def _is_local(self, key):
+        return not str(key).startswith(self._exclude)
+
+    def _local_key(self, key, version):
+        """Ключ локального уровня или None, если ключ только общий."""
+        if not self._is_local(key):
+            return None
+        return self.make_key(key, version)
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._store.checked_at < self._sync_interval:
+            return
+        generation = self.shared.get(GENERATION_KEY)
+        with self._lock:
+            self._store.checked_at = now
+            if generation != self._store.generation:
+                self._store.entries.clear()
+                self._store.generation = generation
+
+    def _bump(self):
+        try:
+            self.shared.incr(GENERATION_KEY)
+        except ValueError:
+            self.shared.add(GENERATION_KEY, int(time.time() * 1000), None)
+
+    def _local_get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._store.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._store.entries[key]
+                return None
+            self._store.entries.move_to_end(key)
+            return entry
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if key is None:
+            return
+        ttl = self._local_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            ttl = min(ttl, timeout)
+        if ttl <= 0:
+            self._local_pop(key)
+            return
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._store.entries[key] = (value, time.monotonic() + ttl)
+            self._store.entries.move_to_end(key)
+            while len(self._store.entries) > self._local_max:
+                self._store.entries.popitem(last=False)
+
+    def _local_pop(self, key):
+        if key is None:
+            return
+        with self._lock:
+            self._store.entries.pop(key, None)
+
+    @timed('cache_get')
+    def get(self, key, default=None, version=None):
+        version = self._version(version)
+        local_key = self._local_key(key, version)
+        self._sync()
+        entry = self._local_get(local_key)
+        if entry is not None:
+            _count_reads(local=1)
+            return pickle.loads(entry[0])
+        missing = object()
+        value = self.shared.get(key, missing, version=version)
+        if value is missing:
+            _count_reads(miss=1)
+            return default
+        _count_reads(shared=1)
+        self._local_set(local_key, value)
+        return value
+
+    @timed('cache_get')
+    def get_many(self, keys, version=None):
+        version = self._version(version)
+        self._sync()
+        found, missing = {}, []
+        for key in keys:
+            entry = self._local_get(self._local_key(key, version))
+            if entry is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(entry[0])
+        local = len(found)
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._local_set(self._local_key(key, version), value)
+            found.update(fetched)
+        _count_reads(local=local, shared=len(found) - local,
+                     miss=len(missing) - (len(found) - local))
+        return found
+
+    @timed('cache_set')
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(self._local_key(key, version), value, timeout)
+
+    @timed('cache_set')
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._local_set(self._local_key(key, version), value, timeout)
+        return failed
+
+    @timed('cache_set')
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(self._local_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout,
+                                 version=self._version(version))
+
+    @timed('cache_get')
+    def has_key(self, key, version=None):
+        version = self._version(version)
+        self._sync()
+        if self._local_get(self._local_key(key, version)) is not None:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    @timed('cache_set')
+    def incr(self, key, delta=1, version=None):
+        version = self._version(version)
+        value = self.shared.incr(key, delta, version=version)
+        if self._is_local(key):
+            self._local_pop(self._local_key(key, version))
+            self._bump()
+        return value
+
+    @timed('cache_set')
+    def delete(self, key, version=None):
+        version = self._version(version)
+        self.shared.delete(key, version=version)
+        if self._is_local(key):
+            self._local_pop(self._local_key(key, version))
+            self._bump()
+
+    @timed('cache_set')
+    def delete_many(self, keys, version=None):
+        version = self._version(version)
+        self.shared.delete_many(keys, version=version)
+        for key in keys:
+            self._local_pop(self._local_key(key, version))
+        self._bump()
+
+    def clear(self):
+        self.shared.clear()
+        with self._lock:
+            self._store.entries.clear()
+        self._bump()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
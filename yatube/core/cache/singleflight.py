@@ -0,0 +1,61 @@
+"""Защита от «стада» при пересчёте закешированных значений.
+
+Значение хранится в конверте (value, fresh_until, delta) дольше своего
+TTL, чтобы устаревшую копию можно было отдать, пока один процесс
+пересчитывает её под блокировкой cache.add(). Кроме того, пересчёт
+начинается немного раньше срока с вероятностью, растущей к концу TTL
+(probabilistic early expiration, XFetch).
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+STALE_GRACE = 60 * 5
+LOCK_TIMEOUT = 30
+WAIT_STEP = 0.05
+WAIT_STEPS = 20
+
+
+def _should_refresh(fresh_until, delta, beta):
+    # -log(U) > 0, поэтому чем дольше пересчёт (delta), тем раньше
+    # кто-то из процессов вызовется обновить значение.
+    early = delta * beta * -math.log(random.random() or 1e-12)
+    return time.time() + early >= fresh_until
+
+
+def get_or_compute(key, compute, timeout, cache=None, beta=1.0,
+                   grace=STALE_GRACE, lock_timeout=LOCK_TIMEOUT):
+    """Возвращает значение из кеша, пересчитывая его только в одном месте.
+
+    compute вызывается без аргументов. Пока блокировку держит другой
+    процесс, остальные получают устаревшую копию, а если её нет —
+    недолго ждут появления свежей.
+    """
+    cache = cache or default_cache
+    envelope = cache.get(key)
+    if envelope is not None:
+        value, fresh_until, delta = envelope
+        if not _should_refresh(fresh_until, delta, beta):
+            return value
+    lock_key = 'lock:' + key
+    if not cache.add(lock_key, 1, lock_timeout):
+        if envelope is not None:
+            return envelope[0]
+        for _ in range(WAIT_STEPS):
+            time.sleep(WAIT_STEP)
+            envelope = cache.get(key)
+            if envelope is not None:
+                return envelope[0]
+        # Держатель блокировки не успел: считаем сами, но не пишем.
+        return compute()
+    try:
+        started = time.time()
+        value = compute()
+        delta = time.time() - started
+        envelope = (value, time.time() + timeout, delta)
+        cache.set(key, envelope, timeout + grace)
+        return value
+    finally:
+        cache.delete(lock_key)
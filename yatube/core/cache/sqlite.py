@@ -0,0 +1,270 @@
+"""Кеш в SQLite-файле, общий для всех процессов на хосте.
+
+В отличие от LocMemCache содержимое видят все воркеры gunicorn и оно
+переживает перезапуск. База открывается в режиме WAL: читатели не
+блокируют писателя. Суммарный размер значений ведут триггеры, поэтому
+проверка лимитов не сканирует таблицу; при превышении MAX_ENTRIES или
+MAX_SIZE вытесняются просроченные, затем давно не читавшиеся ключи
+(LRU). Время чтения копится в памяти процесса и пишется пачкой раз в
+ACCESS_FLUSH_INTERVAL секунд или перед вытеснением, так что попадание
+в кеш не превращается в запись. incr и add выполняются в BEGIN
+IMMEDIATE и атомарны между процессами.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.sqlite.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000, 'MAX_SIZE': 256 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,'
+    ' accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+    ' entries INTEGER NOT NULL, size INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_ins AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries + 1,'
+    ' size = size + NEW.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_del AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries - 1,'
+    ' size = size - OLD.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_upd AFTER UPDATE OF size ON cache'
+    ' BEGIN UPDATE cache_stats SET size = size - OLD.size + NEW.size; END',
+)
+
+# Время последнего чтения обновляется не чаще раза в секунду:
+# точности LRU хватает, а запись на каждое чтение не нужна.
+ACCESS_RESOLUTION = 1.0
+# Отложенные отметки чтения пишутся одной транзакцией.
+ACCESS_FLUSH_INTERVAL = 30.0
+ACCESS_FLUSH_BATCH = 1000
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 0)) or None
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+        self._access_lock = threading.Lock()
+        self._accessed = {}
+        self._flushed = time.monotonic()
+
+    def _connection(self):
+        # Соединение на поток; после fork открываем новое.
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self._path, timeout=self._busy_timeout,
+                               isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        # Без этого INSERT OR REPLACE не вызывает триггер удаления
+        # и учёт размера в cache_stats разъезжается.
+        conn.execute('PRAGMA recursive_triggers=ON')
+        with self._write(conn):
+            for statement in SCHEMA:
+                conn.execute(statement)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self, conn=None):
+        conn = conn or self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _fresh(self, row, now):
+        return row is not None and (row[1] is None or row[1] > now)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,)).fetchone()
+        if not self._fresh(row, now):
+            return default
+        if row[2] < now - ACCESS_RESOLUTION:
+            self._note_access([key], now)
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        marks = ','.join('?' * len(keys))
+        rows = self._connection().execute(
+            f'SELECT key, expires, value FROM cache WHERE key IN ({marks})',
+            list(keys)).fetchall()
+        found = {key: value for key, expires, value in rows
+                 if expires is None or expires > now}
+        self._note_access(found, now)
+        return {keys[key]: pickle.loads(value)
+                for key, value in found.items()}
+
+    def _note_access(self, keys, now):
+        with self._access_lock:
+            self._accessed.update(dict.fromkeys(keys, now))
+            due = (len(self._accessed) >= ACCESS_FLUSH_BATCH
+                   or time.monotonic() - self._flushed
+                   >= ACCESS_FLUSH_INTERVAL)
+        if not due:
+            return
+        try:
+            with self._write() as conn:
+                self._flush_access(conn)
+        except sqlite3.OperationalError:
+            # База занята: отметки LRU подождут следующего раза.
+            pass
+
+    def _flush_access(self, conn):
+        with self._access_lock:
+            accessed, self._accessed = self._accessed, {}
+            self._flushed = time.monotonic()
+        conn.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ? AND accessed < ?',
+            [(when, key, when) for key, when in accessed.items()])
+
+    def _store(self, conn, key, value, timeout, mode):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        conn.execute(
+            f'INSERT OR {mode} INTO cache '
+            '(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+            (key, blob, self.get_backend_timeout(timeout), time.time(),
+             len(blob)))
+        return conn.execute('SELECT changes()').fetchone()[0]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            self._store(conn, key, value, timeout, 'REPLACE')
+            self._cull(conn)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as conn:
+            for key, value in data.items():
+                self._store(conn, self._key(key, version), value,
+                            timeout, 'REPLACE')
+            self._cull(conn)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            conn.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()))
+            added = self._store(conn, key, value, timeout, 'IGNORE')
+            if added:
+                self._cull(conn)
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            conn.execute(
+                'UPDATE cache SET expires = ? WHERE key = ?'
+                ' AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()))
+            return conn.execute('SELECT changes()').fetchone()[0] == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            row = conn.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (key,)).fetchone()
+            if not self._fresh(row, time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            conn.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (blob, len(blob), key))
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT key, expires FROM cache WHERE key = ?',
+            (key,)).fetchone()
+        return self._fresh(row, time.time())
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._write() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        with self._write() as conn:
+            conn.executemany('DELETE FROM cache WHERE key = ?',
+                             [(self._key(key, version),) for key in keys])
+
+    def clear(self):
+        with self._write() as conn:
+            conn.execute('DELETE FROM cache')
+
+    def _cull(self, conn):
+        entries, size = conn.execute(
+            'SELECT entries, size FROM cache_stats').fetchone()
+        over_entries = entries > self._max_entries
+        over_size = self._max_size is not None and size > self._max_size
+        if not (over_entries or over_size):
+            return
+        self._flush_access(conn)
+        conn.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        entries, size = conn.execute(
+            'SELECT entries, size FROM cache_stats').fetchone()
+        while entries > self._max_entries or (
+                self._max_size is not None and size > self._max_size):
+            if self._cull_frequency:
+                batch = max(entries // self._cull_frequency, 1)
+            else:
+                batch = entries
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache'
+                ' ORDER BY accessed LIMIT ?)', (batch,))
+            entries, size = conn.execute(
+                'SELECT entries, size FROM cache_stats').fetchone()
+            if not entries:
+                break
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок потока: открытие базы и PRAGMA
+        # дороже, чем держать файл открытым между запросами.
+        pass
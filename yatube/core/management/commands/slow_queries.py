@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core.models import SlowQuery
+
+ORDERS = {'total': '-total_ms', 'count': '-count', 'max': '-max_ms'}
+
+
+class Command(BaseCommand):
+    help = ('Показывает медленные запросы, больше всего нагружающие базу, '
+            'с представлением и планом.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--order', choices=ORDERS, default='total',
+                            help='По суммарному, числу или худшему времени.')
+        parser.add_argument('--view', help='Только это представление.')
+        parser.add_argument('--reset', action='store_true',
+                            help='Очистить журнал.')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = SlowQuery.objects.all().delete()
+            self.stdout.write(f'удалено записей {deleted}')
+            return
+        queries = SlowQuery.objects.order_by(ORDERS[options['order']])
+        if options['view']:
+            queries = queries.filter(view=options['view'])
+        for query in queries[:options['limit']]:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{query.total_ms:.1f} мс всего, {query.count} раз, '
+                f'до {query.max_ms:.1f} мс — {query.view}'))
+            self.stdout.write(f'  {query.fingerprint}')
+            for line in query.plan.splitlines():
+                self.stdout.write(f'    {line}')
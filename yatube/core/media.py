@@ -0,0 +1,167 @@
+"""Раздача MEDIA_ROOT без чтения файлов в память воркера.
+
+После проверки пути ответ отдаётся фронтенд-серверу:
+MEDIA_ACCEL = 'nginx' — заголовок X-Accel-Redirect на внутренний
+location MEDIA_ACCEL_PREFIX, 'sendfile' — X-Sendfile с путём на диске
+(Apache mod_xsendfile, lighttpd). Без MEDIA_ACCEL файл отдаёт
+FileResponse: wsgi.file_wrapper позволяет серверу использовать
+sendfile(). Поддерживаются ETag/If-None-Match, If-Modified-Since и один
+диапазон Range.
+
+    location /protected-media/ {
+        internal;
+        alias /srv/yatube/media/;
+    }
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+DEFAULT_PREFIXES = ('posts/', 'cache/')
+DEFAULT_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+_range = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def allowed(path):
+    """Можно ли отдать path: только картинки из разрешённых каталогов.
+
+    Картинки постов публичны, как и сами посты, поэтому пользователь не
+    проверяется: отбираются лишь каталоги и расширения.
+    """
+    prefixes = tuple(getattr(settings, 'MEDIA_SERVE_PREFIXES',
+                             DEFAULT_PREFIXES))
+    extensions = tuple(getattr(settings, 'MEDIA_SERVE_EXTENSIONS',
+                               DEFAULT_EXTENSIONS))
+    parts = path.split('/')
+    return (path.startswith(prefixes)
+            and path.lower().endswith(extensions)
+            and not any(part.startswith('.') or part == '' for part in parts))
+
+
+def _etag(stat):
+    # Как у nginx: время изменения и размер, без чтения файла.
+    return '"{:x}-{:x}"'.format(int(stat.st_mtime), stat.st_size)
+
+
+def _parse_range(header, size):
+    """(начало, конец включительно), None — весь файл, False — 416."""
+    match = _range.match(header.strip())
+    if not match:
+        # Несколько диапазонов и прочие единицы не поддерживаем.
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        length = int(end)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class _Slice:
+    """Файл, читаемый только в пределах диапазона."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _accelerated(path, full_path, content_type):
+    accel = getattr(settings, 'MEDIA_ACCEL', None)
+    if not accel:
+        return None
+    response = HttpResponse(content_type=content_type)
+    if accel == 'nginx':
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = posixpath.join(prefix, path)
+    elif accel == 'sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        raise ValueError(f'MEDIA_ACCEL: неизвестный режим {accel}')
+    return response
+
+
+def _not_modified(request, stat, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return if_none_match == '*' or etag in parse_etags(if_none_match)
+    return not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime,
+        stat.st_size)
+
+
+def _file_response(request, full_path, stat, content_type):
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and stat.st_size:
+        byte_range = _parse_range(request.META['HTTP_RANGE'], stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    file = open(full_path, 'rb')
+    if not byte_range:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = stat.st_size
+        return response
+    start, end = byte_range
+    response = FileResponse(_Slice(file, start, end - start + 1),
+                            status=206, content_type=content_type)
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    return response
+
+
+@require_safe
+def serve(request, path):
+    if not allowed(path):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    content_type = (mimetypes.guess_type(full_path)[0]
+                    or 'application/octet-stream')
+    response = _accelerated(path, full_path, content_type)
+    if response is not None:
+        # Заголовки условных запросов и Range обработает сервер.
+        return response
+    etag = _etag(stat)
+    if _not_modified(request, stat, etag):
+        return HttpResponseNotModified()
+    response = _file_response(request, full_path, stat, content_type)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 60 * 60 * 24 * 365)
+    response['Cache-Control'] = f'public, max-age={max_age}'
+    return response
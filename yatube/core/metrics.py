@@ -0,0 +1,280 @@
+"""Метрики в формате Prometheus: /metrics.
+
+MetricsMiddleware считает запросы, их длительность (гистограмма по
+имени URL: posts:index, posts:follow_index, …) и SQL-запросы;
+LayeredCache — попадания и промахи, posts.thumbnails — нарезанные
+миниатюры. Значения — суммы, поэтому процессы не делят состояние:
+каждый пишет свой файл METRICS_DIR/<pid>.db через mmap (запись —
+несколько байт в память), а /metrics складывает все файлы каталога.
+Без METRICS_DIR значения живут в памяти процесса: у каждого воркера
+свои счётчики, и /metrics показывает только ответивший. Каталог
+очищают при деплое, как multiprocess-каталог prometheus_client.
+
+/metrics отдаётся адресам из METRICS_ALLOWED_IPS (сети тоже можно)
+и запросам с заголовком Authorization: Bearer <METRICS_TOKEN>. Без
+них эндпоинт закрыт: за локальным nginx у всех запросов один адрес.
+"""
+import glob
+import hmac
+import ipaddress
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+INITIAL_SIZE = 64 * 1024
+
+# Имя -> (тип, описание); порядок задаёт порядок вывода.
+REGISTRY = {}
+_le = re.compile(r',?le="([^"]*)"')
+
+
+def register(name, kind, description):
+    REGISTRY[name] = (kind, description)
+
+
+register('yatube_requests_total', 'counter', 'HTTP-запросы.')
+register('yatube_request_duration_seconds', 'histogram',
+         'Время ответа по имени URL.')
+register('yatube_db_queries_total', 'counter', 'SQL-запросы.')
+register('yatube_cache_requests_total', 'counter',
+         'Чтения кеша: попадания по уровням и промахи.')
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def sample(name, labels):
+    """Ключ образца: строка Prometheus без значения."""
+    if not labels:
+        return name
+    pairs = ','.join(f'{key}="{_escape(value)}"'
+                     for key, value in sorted(labels.items()))
+    return f'{name}{{{pairs}}}'
+
+
+class _MemoryStore:
+    def __init__(self):
+        self.values = {}
+
+    def inc(self, key, amount):
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def items(self):
+        return list(self.values.items())
+
+
+class _FileStore:
+    """Значения процесса в mmap-файле.
+
+    Заголовок — занятые байты (uint32, дополнено до 8), затем записи:
+    длина ключа (uint32), ключ, выравнивание до 8, значение (double).
+    Новая запись становится видна читателям, когда обновлён заголовок.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._positions = {key: position
+                           for key, position, _ in _entries(self._map)}
+        self._used = max(struct.unpack_from('I', self._map, 0)[0], 8)
+
+    def _append(self, key):
+        encoded = key.encode()
+        offset = 4 + len(encoded)
+        offset += -offset % 8
+        needed = offset + 8
+        while self._used + needed > len(self._map):
+            size = len(self._map) * 2
+            self._file.truncate(size)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), size)
+        start = self._used
+        struct.pack_into('I', self._map, start, len(encoded))
+        self._map[start + 4:start + 4 + len(encoded)] = encoded
+        struct.pack_into('d', self._map, start + offset, 0.0)
+        self._used += needed
+        struct.pack_into('I', self._map, 0, self._used)
+        self._positions[key] = start + offset
+        return start + offset
+
+    def inc(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        value = struct.unpack_from('d', self._map, position)[0]
+        struct.pack_into('d', self._map, position, value + amount)
+
+    def items(self):
+        return [(key, value) for key, _, value in _entries(self._map)]
+
+
+def _entries(data):
+    used = struct.unpack_from('I', data, 0)[0]
+    position = 8
+    while position < used:
+        length = struct.unpack_from('I', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode()
+        offset = 4 + length
+        offset += -offset % 8
+        value = struct.unpack_from('d', data, position + offset)[0]
+        yield key, position + offset, value
+        position += offset + 8
+
+
+_lock = threading.Lock()
+_state = {}
+
+
+def _store():
+    """Хранилище текущего процесса; после fork заводится новое."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    marker = (os.getpid(), directory)
+    if _state.get('marker') != marker:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'{os.getpid()}.db')
+            _state['store'] = _FileStore(path)
+        else:
+            _state['store'] = _MemoryStore()
+        _state['marker'] = marker
+    return _state['store']
+
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        _store().inc(sample(name, labels), amount)
+
+
+def observe(name, value, **labels):
+    """Наблюдение гистограммы: бакеты нарастающим итогом, _sum, _count."""
+    with _lock:
+        store = _store()
+        for bound in BUCKETS:
+            if value <= bound:
+                store.inc(sample(f'{name}_bucket',
+                                 {**labels, 'le': repr(bound)}), 1)
+        store.inc(sample(f'{name}_bucket', {**labels, 'le': '+Inf'}), 1)
+        store.inc(sample(f'{name}_sum', labels), value)
+        store.inc(sample(f'{name}_count', labels), 1)
+
+
+def collect():
+    """Суммы по всем процессам: {ключ образца: значение}."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    totals = {}
+    if not directory:
+        with _lock:
+            return dict(_store().items())
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < 8:
+            continue
+        for key, _, value in _entries(data):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _family(key):
+    name = key.split('{', 1)[0]
+    for suffix in ('_bucket', '_sum', '_count'):
+        if not name.endswith(suffix):
+            continue
+        base = name[:-len(suffix)]
+        if REGISTRY.get(base, (None,))[0] == 'histogram':
+            return base
+    return name
+
+
+def _order(key):
+    # Бакеты одной серии — по возрастанию le, +Inf последним.
+    match = _le.search(key)
+    if not match:
+        return key, 0.0
+    return _le.sub('', key), float(match.group(1))
+
+
+def render(values):
+    families = {}
+    for key, value in values.items():
+        families.setdefault(_family(key), []).append((key, value))
+    lines = []
+    for name in list(REGISTRY) + sorted(set(families) - set(REGISTRY)):
+        if name not in families:
+            continue
+        kind, description = REGISTRY.get(name, ('untyped', ''))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(families[name],
+                                 key=lambda item: _order(item[0])):
+            lines.append(f'{key} {value:.17g}')
+    return '\n'.join(lines) + '\n'
+
+
+def _allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(header, f'Bearer {token}'):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network)
+               for network in getattr(settings, 'METRICS_ALLOWED_IPS', ()))
+
+
+def view(request):
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        if view_name == 'metrics':
+            return response
+        inc('yatube_requests_total', view=view_name,
+            method=request.method, status=response.status_code)
+        observe('yatube_request_duration_seconds', elapsed, view=view_name)
+        if counter.count:
+            inc('yatube_db_queries_total', counter.count, view=view_name)
+        return response
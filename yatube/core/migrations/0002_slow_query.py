@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=40, verbose_name='Хеш формы')),
+                ('view', models.CharField(max_length=200, verbose_name='Представление')),
+                ('fingerprint', models.TextField(verbose_name='Форма запроса')),
+                ('sample', models.TextField(verbose_name='Пример')),
+                ('plan', models.TextField(blank=True, verbose_name='План')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Сколько раз')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Всего, мс')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Дольше всего, мс')),
+                ('last_seen', models.DateTimeField(auto_now=True, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='slowquery',
+            constraint=models.UniqueConstraint(fields=('digest', 'view'), name='slowquery_unique_digest_view'),
+        ),
+    ]
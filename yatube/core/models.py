@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 
@@ -13,3 +14,56 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class RequestProfile(models.Model):
+    """Профиль одного запроса, снятый core.profiling."""
+    KINDS = (
+        ('cprofile', 'cProfile (.pstats)'),
+        ('sample', 'Сэмплы стека (collapsed)'),
+    )
+    created = models.DateTimeField('Снят', auto_now_add=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             null=True,
+                             on_delete=models.SET_NULL,
+                             related_name='+')
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Адрес', max_length=255)
+    view_name = models.CharField('Представление', max_length=200,
+                                 blank=True)
+    status = models.PositiveSmallIntegerField('Статус')
+    duration_ms = models.FloatField('Длительность, мс')
+    kind = models.CharField('Тип', max_length=10, choices=KINDS)
+    file = models.CharField('Файл', max_length=255)
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
+
+
+class SlowQuery(models.Model):
+    """Медленные запросы одной формы из одного представления."""
+    digest = models.CharField('Хеш формы', max_length=40)
+    view = models.CharField('Представление', max_length=200)
+    fingerprint = models.TextField('Форма запроса')
+    sample = models.TextField('Пример')
+    plan = models.TextField('План', blank=True)
+    count = models.PositiveIntegerField('Сколько раз', default=0)
+    total_ms = models.FloatField('Всего, мс', default=0)
+    max_ms = models.FloatField('Дольше всего, мс', default=0)
+    last_seen = models.DateTimeField('Последний раз', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        constraints = [
+            models.UniqueConstraint(fields=['digest', 'view'],
+                                    name='slowquery_unique_digest_view'),
+        ]
+
+    def __str__(self):
+        return self.fingerprint[:80]
@@ -0,0 +1,158 @@
+"""Профилирование отдельных запросов в продакшене для персонала.
+
+Запрос профилируется, если пользователь — staff и передал подписанный
+токен (token(user), срок жизни PROFILING_TOKEN_MAX_AGE) параметром
+?_profile= или заголовком X-Profile, а без токена — случайно с долей
+PROFILING_SAMPLE_RATE среди запросов персонала. PROFILING_MODE:
+'cprofile' пишет .pstats (snakeviz, pstats), 'sample' — стеки потока
+раз в PROFILING_SAMPLE_INTERVAL секунд в формате collapsed для
+flamegraph.pl и speedscope. Файлы лежат в PROFILING_DIR, список — в
+админке (RequestProfile), id записи — в заголовке X-Profile-Id.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+from .models import RequestProfile
+
+SALT = 'core.profiling'
+EXTENSIONS = {'cprofile': '.pstats', 'sample': '.collapsed'}
+
+
+def token(user):
+    """Подписанный токен, включающий профилирование для user."""
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def _token_valid(value, user):
+    max_age = getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 60 * 60)
+    try:
+        pk = signing.TimestampSigner(salt=SALT).unsign(value, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return pk == str(user.pk)
+
+
+def requested(request):
+    """Нужно ли профилировать запрос."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_staff:
+        return False
+    value = (request.GET.get('_profile')
+             or request.META.get('HTTP_X_PROFILE'))
+    if value:
+        return _token_valid(value, user)
+    return random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+
+
+class Sampler(threading.Thread):
+    """Статистический профайлер: снимает стек потока thread_id."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        # Первый замер сразу: запрос короче интервала тоже даёт стек.
+        self.sample()
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_name} '
+                         f'({os.path.basename(code.co_filename)}'
+                         f':{code.co_firstlineno})')
+            frame = frame.f_back
+        if names:
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.stacks.most_common())
+
+
+def _path(mode):
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:8]
+    return name + EXTENSIONS[mode], directory
+
+
+def summary(profile, limit=30):
+    """Текстовая сводка: топ функций или самых частых стеков."""
+    path = os.path.join(settings.PROFILING_DIR, profile.file)
+    if not os.path.exists(path):
+        return ''
+    if profile.kind == 'sample':
+        with open(path) as file:
+            return ''.join(file.readlines()[:limit])
+    stream = io.StringIO()
+    stats = pstats.Stats(path, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not requested(request):
+            return self.get_response(request)
+        mode = getattr(settings, 'PROFILING_MODE', 'cprofile')
+        started = time.perf_counter()
+        if mode == 'sample':
+            profiler = Sampler(threading.get_ident(), getattr(
+                settings, 'PROFILING_SAMPLE_INTERVAL', 0.005))
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            if mode == 'sample':
+                profiler.stop()
+            else:
+                profiler.disable()
+        duration = time.perf_counter() - started
+        name, directory = _path(mode)
+        if mode == 'sample':
+            with open(os.path.join(directory, name), 'w') as file:
+                file.write(profiler.collapsed())
+        else:
+            profiler.dump_stats(os.path.join(directory, name))
+        match = request.resolver_match
+        profile = RequestProfile.objects.create(
+            user=request.user,
+            method=request.method,
+            path=request.get_full_path()[:255],
+            view_name=match.view_name if match else '',
+            status=response.status_code,
+            duration_ms=duration * 1000,
+            kind=mode,
+            file=name,
+        )
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
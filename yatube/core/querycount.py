@@ -0,0 +1,172 @@
+"""Бюджет SQL-запросов на запрос и поиск N+1.
+
+QueryBudgetMiddleware считает запросы через connection.execute_wrapper
+и группирует их по форме — SQL без параметров и литералов; BEGIN,
+SAVEPOINT и RELEASE в бюджет входят, но в поиске N+1 не участвуют. Форма,
+повторившаяся QUERY_BUDGET_REPEATS раз, почти наверняка N+1: в лог
+пишется строка шаблона или кода, откуда шли запросы. Бюджет
+представления берётся из QUERY_BUDGETS по имени URL
+({'posts:index': 8}), иначе QUERY_BUDGET_DEFAULT. С
+QUERY_BUDGET_STRICT нарушение поднимает QueryBudgetExceeded; в тестах
+то же проверяет QueryBudgetMixin.assertQueryBudget.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+_strings = re.compile(r"'(?:[^']|'')*'")
+_numbers = re.compile(r'\b\d+(?:\.\d+)?\b')
+_placeholders = re.compile(r'%s|\?')
+_lists = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_spaces = re.compile(r'\s+')
+# Управление транзакцией повторяется в каждом atomic() и N+1 не бывает.
+_transaction = re.compile(r'(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b',
+                          re.IGNORECASE)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Форма запроса: литералы — ?, списки IN любой длины — (...)."""
+    sql = _strings.sub('?', sql)
+    sql = _numbers.sub('?', sql)
+    sql = _placeholders.sub('?', sql)
+    sql = _lists.sub('(...)', sql)
+    return _spaces.sub(' ', sql).strip()
+
+
+def _project_file(filename):
+    return (filename.startswith(settings.BASE_DIR)
+            and filename != __file__
+            and 'site-packages' not in filename)
+
+
+def _above_wrappers(frame):
+    """Первый кадр над цепочкой execute_wrapper.
+
+    Обёртки slowlog, timing и metrics тоже лежат в проекте; без этого
+    любой N+1 из кода приписывался бы им.
+    """
+    start = frame
+    while frame is not None:
+        if frame.f_code.co_name == '_execute_with_wrappers':
+            return frame.f_back
+        frame = frame.f_back
+    return start
+
+
+def location(frame):
+    """Строка шаблона, из которой пришёл запрос, иначе — строка кода."""
+    frame = _above_wrappers(frame)
+    code = None
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        # type(), а не isinstance: у ленивых объектов вроде request.user
+        # обращение к __class__ само выполняет запрос.
+        if (issubclass(type(node), Node) and node.token is not None
+                and getattr(node, 'origin', None)):
+            name = node.origin.template_name or node.origin.name
+            return f'{name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if code is None and _project_file(filename):
+            code = (f'{os.path.relpath(filename, settings.BASE_DIR)}'
+                    f':{frame.f_lineno}')
+        frame = frame.f_back
+    return code
+
+
+class QueryLog:
+    """Счётчик запросов для connection.execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+        self.locations = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        if not _transaction.match(sql.lstrip()):
+            shape = fingerprint(sql)
+            self.shapes[shape] += 1
+            self.locations[shape][location(sys._getframe(1))] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold=None):
+        """[(форма, сколько раз, [(место, сколько раз), …]), …]."""
+        if threshold is None:
+            threshold = getattr(settings, 'QUERY_BUDGET_REPEATS', 3)
+        return [(shape, n, self.locations[shape].most_common(3))
+                for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+@contextmanager
+def record():
+    """Считает запросы ко всем базам внутри блока."""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(log))
+        yield log
+
+
+def budget_for(view_name):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(view_name,
+                       getattr(settings, 'QUERY_BUDGET_DEFAULT', 20))
+
+
+def problems(log, view_name, budget=None):
+    """Описания нарушений: превышение бюджета и повторяющиеся формы."""
+    if budget is None:
+        budget = budget_for(view_name)
+    found = []
+    if log.count > budget:
+        found.append(f'{view_name}: {log.count} SQL-запросов '
+                     f'при бюджете {budget}')
+    for shape, n, places in log.repeated():
+        where = ', '.join(f'{place} ×{k}' for place, k in places)
+        found.append(f'{view_name}: N+1, {n} раз {shape} — {where}')
+    return found
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record() as log:
+            response = self.get_response(request)
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        found = problems(log, view_name)
+        for problem in found:
+            logger.warning(problem)
+        if found and getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded('\n'.join(found))
+        return response
+
+
+class QueryBudgetMixin:
+    """Для TestCase: проверка бюджета и N+1 внутри блока with."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget=None, view_name='test'):
+        with record() as log:
+            yield log
+        found = problems(log, view_name, budget)
+        if found:
+            self.fail('\n'.join(found))
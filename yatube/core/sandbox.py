@@ -0,0 +1,48 @@
+"""Одноразовое окружение для замеров из management-команд.
+
+sandbox() поднимает тестовые базы, как manage.py test: команды, которые
+генерируют данные или меняют индексы, не трогают рабочую базу и не
+держат её блокировку записи, пока идёт замер. Кеши на это время тоже
+подменяются: общие уровни пишутся во временные файлы, а локальный
+уровень LayeredCache очищается до и после, так что cache.clear() в
+замере не стирает рабочий кеш и тестовые объекты в него не попадают.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+
+from core.cache import layered
+
+LAYERED = 'core.cache.layered.LayeredCache'
+
+
+def _caches(directory):
+    """CACHES с теми же алиасами, но в файлах внутри directory."""
+    return {
+        alias: options if options['BACKEND'] == LAYERED else {
+            'BACKEND': 'core.cache.sqlite.SQLiteCache',
+            'LOCATION': os.path.join(directory, f'{alias}.sqlite3'),
+            'OPTIONS': options.get('OPTIONS', {}),
+        }
+        for alias, options in settings.CACHES.items()
+    }
+
+
+@contextmanager
+def sandbox():
+    with tempfile.TemporaryDirectory() as directory, \
+            override_settings(CACHES=_caches(directory)):
+        layered._stores.clear()
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            yield
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+            layered._stores.clear()
@@ -0,0 +1,111 @@
+"""Журнал медленных SQL-запросов с планами.
+
+SlowQueryMiddleware оборачивает соединения execute_wrapper и замечает
+запросы дольше SLOW_QUERY_THRESHOLD_MS. После ответа для каждого такого
+SELECT снимается план (EXPLAIN QUERY PLAN в SQLite), а запрос
+складывается в SlowQuery по форме (core.querycount.fingerprint) и
+представлению, которое его выполнило (posts.views.index): растут число,
+суммарное и максимальное время. Топ выводит manage.py slow_queries.
+"""
+import hashlib
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import SlowQuery
+from .querycount import fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def view_tag(request):
+    match = request.resolver_match
+    if match is None:
+        return request.path
+    return f'{match.func.__module__}.{match.func.__name__}'
+
+
+def explain(connection, sql, params):
+    """План запроса текстом или '' для не-SELECT и ошибок."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return ''
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+
+def _bump(rows, elapsed_ms):
+    return rows.update(count=F('count') + 1,
+                       total_ms=F('total_ms') + elapsed_ms,
+                       max_ms=Greatest(F('max_ms'), Value(elapsed_ms)))
+
+
+def record(view, sql, params, elapsed_ms, plan):
+    shape = fingerprint(sql)
+    digest = hashlib.sha1(shape.encode()).hexdigest()
+    rows = SlowQuery.objects.filter(digest=digest, view=view)
+    if _bump(rows, elapsed_ms):
+        return
+    # Первая встреча: строку создаём, гонку решает unique. Повтор один:
+    # если строку успели удалить (slow_queries --reset), замер теряется.
+    SlowQuery.objects.bulk_create([SlowQuery(
+        digest=digest, view=view, fingerprint=shape,
+        sample=f'{sql} -- {params!r}'[:10000], plan=plan,
+    )], ignore_conflicts=True)
+    _bump(rows, elapsed_ms)
+
+
+class _Recorder:
+    def __init__(self, connection, threshold):
+        self.connection = connection
+        self.threshold = threshold
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms >= self.threshold and not many:
+                self.slow.append((sql, params, elapsed_ms))
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+        if self.threshold is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorders = [_Recorder(connection, self.threshold)
+                     for connection in connections.all()]
+        with ExitStack() as stack:
+            for recorder in recorders:
+                stack.enter_context(
+                    recorder.connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        # Планы и запись — уже вне обёртки, их время не считается.
+        view = view_tag(request)
+        for recorder in recorders:
+            for sql, params, elapsed_ms in recorder.slow:
+                logger.warning('%.1f мс %s: %s', elapsed_ms, view, sql)
+                # Ответ уже готов: занятая база не должна делать из него 500.
+                try:
+                    plan = explain(recorder.connection, sql, params)
+                    record(view, sql, params, elapsed_ms, plan)
+                except DatabaseError:
+                    logger.exception('Медленный запрос %s не записан', view)
+        return response
@@ -0,0 +1,65 @@
+"""Файловое хранилище с адресацией по содержимому.
+
+Имя файла — sha256 содержимого, разложенный по каталогам из первых
+байтов хеша: posts/ab/cd/abcd….jpg. Повторная загрузка той же картинки
+не создаёт новый файл, а возвращает имя уже лежащего; миниатюры sorl
+привязаны к имени исходника и тоже переиспользуются. Файлы не
+удаляются при удалении поста — учёт ссылок и сборка мусора на стороне
+приложения (posts.blobs, manage.py gc_media).
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Два уровня по 256 каталогов: ~16 файлов на каталог при миллионе.
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+
+def content_name(directory, content, extension):
+    """Имя файла по sha256 содержимого; content читается потоково."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    hexdigest = digest.hexdigest()
+    shards = [hexdigest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH]
+              for i in range(SHARD_LEVELS)]
+    return posixpath.join(directory, *shards, hexdigest + extension.lower())
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        name = content_name(directory, content,
+                            os.path.splitext(filename)[1])
+        if self.exists(name):
+            try:
+                # Свежий mtime: сборщик мусора не удалит файл, на который
+                # вот-вот сошлётся новый пост (posts.blobs).
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        try:
+            return self._save(name, content)
+        except FileExistsError:
+            # Тот же файл параллельно записал другой процесс.
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Имя уникально по содержимому, подбирать другое нельзя: занятое
+        # имя значит, что этот файл уже записан (_save зовёт нас в цикле).
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
@@ -0,0 +1,31 @@
+"""Настройки, с которыми идут тесты.
+
+Тесты не трогают файл кеша разработки: общий уровень кеша — в памяти
+процесса, и состояние не переходит между запусками. Миниатюры не режутся
+фоновым потоком, который писал бы во временный MEDIA_ROOT тестов в любой
+момент; тесты воркера включают его сами. manage.py test применяет эти
+настройки через TestRunner, pytest — фикстурой из conftest.py.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def overrides():
+    caches = dict(settings.CACHES)
+    caches['shared'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yatube-tests',
+    }
+    return {'CACHES': caches, 'THUMBNAIL_WORKER': 'off'}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._settings = override_settings(**overrides())
+        self._settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._settings.disable()
+        super().teardown_test_environment(**kwargs)
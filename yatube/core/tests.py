@@ -0,0 +1,560 @@
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.template import Context, Template
+from django.contrib.auth.models import Group, User
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import Client, TestCase, override_settings
+from django.urls import path as url_path, reverse
+
+from core.cache import layered
+from core.cache.layered import LayeredCache
+from core.cache.singleflight import get_or_compute
+from core.cache.sqlite import SQLiteCache
+from core.querycount import (QueryBudgetExceeded, QueryBudgetMixin,
+                             QueryLog, fingerprint, record)
+from core import metrics, profiling, slowlog
+from core.models import RequestProfile, SlowQuery
+from core.sandbox import sandbox
+from posts.models import Post
+from core.timing import phase, timed
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_computes_once_and_caches(self):
+        """Значение считается один раз и берётся из кеша."""
+        compute = mock.Mock(return_value='page')
+        self.assertEqual(get_or_compute('k', compute, 60), 'page')
+        self.assertEqual(get_or_compute('k', compute, 60), 'page')
+        compute.assert_called_once()
+
+    def test_stale_copy_served_while_locked(self):
+        """Пока другой процесс держит блокировку, отдаётся старая копия."""
+        cache.set('k', ('old', 0, 0.1), 60)
+        cache.add('lock:k', 1, 30)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(get_or_compute('k', compute, 60), 'old')
+        compute.assert_not_called()
+
+    def test_expired_value_refreshed_by_lock_holder(self):
+        """Устаревшее значение пересчитывает получивший блокировку."""
+        cache.set('k', ('old', 0, 0.1), 60)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(get_or_compute('k', compute, 60), 'new')
+        self.assertIsNone(cache.get('lock:k'))
+
+    def test_template_tag(self):
+        """Тег singleflight_cache кеширует фрагмент."""
+        template = Template(
+            '{% load singleflight %}'
+            '{% singleflight_cache 60 frag page %}{{ value }}'
+            '{% endsingleflight_cache %}')
+        first = template.render(Context({'value': 'a', 'page': 1}))
+        cached = template.render(Context({'value': 'b', 'page': 1}))
+        other = template.render(Context({'value': 'c', 'page': 2}))
+        self.assertEqual((first, cached, other), ('a', 'a', 'c'))
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = SQLiteCache(os.path.join(self.tmp, 'c.sqlite3'), {
+            'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_set_get_delete(self):
+        """Базовые операции и истечение срока."""
+        self.cache.set('a', {'x': 1})
+        self.assertEqual(self.cache.get('a'), {'x': 1})
+        self.cache.set('b', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('b'))
+        self.cache.delete('a')
+        self.assertFalse(self.cache.has_key('a'))
+
+    def test_add_and_incr(self):
+        """add не перезаписывает ключ, incr атомарно увеличивает."""
+        self.assertTrue(self.cache.add('n', 1))
+        self.assertFalse(self.cache.add('n', 5))
+        self.assertEqual(self.cache.incr('n', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_shared_between_instances(self):
+        """Другой экземпляр (процесс) видит те же данные."""
+        self.cache.set('shared', 'yes')
+        other = SQLiteCache(self.cache._path, {})
+        self.assertEqual(other.get('shared'), 'yes')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся ключи."""
+        with mock.patch('core.cache.sqlite.time.time') as now:
+            for tick, key in enumerate('abc'):
+                now.return_value = 1000 + tick * 10
+                self.cache.set(key, key, timeout=None)
+            now.return_value = 1100
+            self.cache.get('a')
+            now.return_value = 1110
+            self.cache.set('d', 'd', timeout=None)
+        self.assertEqual(self.cache.get_many('abcd'),
+                         {'a': 'a', 'c': 'c', 'd': 'd'})
+
+    def test_reads_do_not_write(self):
+        """Отметки чтения копятся и пишутся пачкой."""
+        def accessed():
+            return self.cache._connection().execute(
+                'SELECT accessed FROM cache WHERE key = ?',
+                (self.cache.make_key('a'),)).fetchone()[0]
+
+        with mock.patch('core.cache.sqlite.time.time') as now:
+            now.return_value = 1000
+            self.cache.set('a', 'a', timeout=None)
+            now.return_value = 1100
+            self.assertEqual(self.cache.get('a'), 'a')
+            self.assertEqual(accessed(), 1000)
+            with mock.patch('core.cache.sqlite.ACCESS_FLUSH_INTERVAL', 0):
+                self.cache.get_many(['a'])
+        self.assertEqual(accessed(), 1100)
+
+    def test_size_limit(self):
+        """MAX_SIZE ограничивает суммарный размер значений."""
+        limited = SQLiteCache(os.path.join(self.tmp, 's.sqlite3'), {
+            'OPTIONS': {'MAX_SIZE': 3000},
+        })
+        for i in range(10):
+            limited.set(i, 'x' * 1000)
+        stats = limited._connection().execute(
+            'SELECT size FROM cache_stats').fetchone()[0]
+        self.assertLessEqual(stats, 3000)
+
+
+class LayeredCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.shared = SQLiteCache(os.path.join(self.tmp, 'c.sqlite3'), {})
+        patcher = mock.patch('core.cache.layered.caches',
+                             {'shared': self.shared})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        layered._stores.clear()
+        self.cache = LayeredCache('shared', {
+            'OPTIONS': {'SYNC_INTERVAL': 0},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_local_hit_skips_shared(self):
+        """Повторное чтение идёт из памяти процесса."""
+        self.cache.set('hot', 'value')
+        with mock.patch.object(self.shared, 'get') as shared_get:
+            shared_get.return_value = None
+            self.assertEqual(self.cache.get('hot'), 'value')
+            shared_get.assert_called_once_with(layered.GENERATION_KEY)
+
+    def test_local_values_are_copies(self):
+        """Изменение прочитанного объекта не меняет закешированный."""
+        self.cache.set('hot', {'items': [1]})
+        self.cache.get('hot')['items'].append(2)
+        self.assertEqual(self.cache.get('hot'), {'items': [1]})
+        self.assertIsNot(self.cache.get('hot'), self.cache.get('hot'))
+
+    def test_invalidation_reaches_other_process(self):
+        """Сброс в одном процессе виден локальному уровню другого."""
+        self.cache.set('version', 1)
+        self.assertEqual(self.cache.get('version'), 1)
+        # Другой процесс: свой локальный уровень, тот же общий кеш.
+        layered._stores.clear()
+        other = LayeredCache('shared', {'OPTIONS': {'SYNC_INTERVAL': 0}})
+        self.assertIsNot(other._store, self.cache._store)
+        other.incr('version')
+        self.assertEqual(self.cache.get('version'), 2)
+
+    def test_excluded_keys_stay_shared(self):
+        """Блокировки не кешируются локально и не меняют поколение."""
+        self.cache.add('lock:x', 1)
+        self.cache.delete('lock:x')
+        self.assertIsNone(self.shared.get(layered.GENERATION_KEY))
+        self.assertFalse(self.cache._store.entries)
+
+
+class MediaServeTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'posts'))
+        self.content = bytes(range(256)) * 4
+        with open(os.path.join(self.root, 'posts', 'a.jpg'), 'wb') as file:
+            file.write(self.content)
+        with open(os.path.join(self.root, 'secret.jpg'), 'wb') as file:
+            file.write(b'secret')
+        media_settings = override_settings(MEDIA_ROOT=self.root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.url = reverse('media', kwargs={'path': 'posts/a.jpg'})
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file_with_validators(self):
+        """Файл отдаётся целиком с ETag, повторный запрос — 304."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        """Range отдаёт только запрошенные байты."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.body(response), self.content[10:20])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(self.body(response), self.content[-4:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_authorization(self):
+        """Чужие каталоги и выход из MEDIA_ROOT — 404."""
+        for path in ('secret.jpg', 'posts/../secret.jpg',
+                     'posts/missing.jpg', 'posts/.hidden.jpg'):
+            with self.subTest(path=path):
+                response = self.client.get(
+                    reverse('media', kwargs={'path': path}))
+                self.assertEqual(response.status_code, 404)
+
+    def test_accel_headers(self):
+        """С MEDIA_ACCEL файл отдаёт фронтенд, тело пустое."""
+        with override_settings(MEDIA_ACCEL='nginx'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/posts/a.jpg')
+        self.assertEqual(response.content, b'')
+        with override_settings(MEDIA_ACCEL='sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'],
+                         os.path.join(self.root, 'posts', 'a.jpg'))
+
+
+def n_plus_one_view(request):
+    names = [user.groups.first().name for user in User.objects.all()]
+    return HttpResponse(' '.join(names))
+
+
+urlpatterns = [url_path('n-plus-one/', n_plus_one_view)]
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            user = User.objects.create(username=f'user{i}')
+            user.groups.add(Group.objects.create(name=f'group{i}'))
+
+    def test_fingerprint_ignores_literals_and_list_length(self):
+        """Форма не зависит от значений и длины списка IN."""
+        self.assertEqual(
+            fingerprint("SELECT a FROM t WHERE id IN (1, 2, 3) AND s = 'x'"),
+            fingerprint('SELECT a FROM t WHERE id IN (%s) AND s = %s'))
+
+    def test_repeated_shape_reported_with_template_line(self):
+        """N+1 из шаблона указывает на строку шаблона."""
+        template = Template('{% for user in users %}\n'
+                            '{{ user.groups.first.name }}\n'
+                            '{% endfor %}')
+        with record() as log:
+            template.render(Context({'users': User.objects.all()}))
+        [(shape, count, places)] = log.repeated()
+        self.assertEqual(count, 3)
+        self.assertTrue(places[0][0].endswith(':2'))
+
+    def test_transaction_statements_are_not_n_plus_one(self):
+        """BEGIN и SAVEPOINT каждого atomic() — не N+1, но в бюджете."""
+        log = QueryLog()
+        for i in range(3):
+            for sql in ('BEGIN', f'SAVEPOINT "s{i}"',
+                        f'RELEASE SAVEPOINT "s{i}"'):
+                log(lambda *args: None, sql, None, False, {})
+        self.assertEqual(log.count, 9)
+        self.assertEqual(log.repeated(), [])
+
+    def test_budget_helper_fails_on_n_plus_one(self):
+        """assertQueryBudget проваливает тест с N+1, prefetch его чинит."""
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget(budget=10):
+                for user in User.objects.all():
+                    list(user.groups.all())
+        with self.assertQueryBudget(budget=2):
+            for user in User.objects.prefetch_related('groups'):
+                list(user.groups.all())
+
+    @override_settings(ROOT_URLCONF=__name__, QUERY_BUDGET_ENABLED=True,
+                       SERVER_TIMING_SAMPLE_RATE=1.0,
+                       SLOW_QUERY_THRESHOLD_MS=0)
+    def test_middleware_blames_view_not_query_wrappers(self):
+        """Со всеми обёртками SQL из MIDDLEWARE N+1 указывает на вид."""
+        cache.clear()
+        with self.assertLogs('core.querycount', 'WARNING') as logs:
+            Client().get('/n-plus-one/')
+        line = n_plus_one_view.__code__.co_firstlineno + 1
+        [message] = logs.output
+        self.assertIn(f'core/tests.py:{line} ×3', message)
+
+    @override_settings(QUERY_BUDGET_STRICT=True,
+                       QUERY_BUDGETS={'posts:index': 0})
+    def test_strict_middleware_raises_over_budget(self):
+        """В строгом режиме превышение бюджета — исключение."""
+        cache.clear()
+        with self.assertRaises(QueryBudgetExceeded):
+            Client().get(reverse('posts:index'))
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_header_and_log_record(self):
+        """Фазы запроса попадают в Server-Timing и в запись лога."""
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = Client().get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for name in ('db', 'cache_get', 'render', 'context_processors',
+                     'total'):
+            self.assertIn(f'{name};dur=', header)
+        record = logs.records[0]
+        self.assertEqual(record.view, 'posts:index')
+        self.assertEqual(record.status, 200)
+        self.assertGreater(record.timings['db']['count'], 0)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_disabled_without_sampling(self):
+        """С долей 0 middleware отключается."""
+        response = Client().get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_phases_are_noop_outside_request(self):
+        """Вне запроса из выборки разметка ничего не делает."""
+        with phase('x'):
+            self.assertEqual(timed('x')(lambda: 1)(), 1)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(METRICS_DIR=self.directory,
+                                              METRICS_TOKEN='secret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_requests_histogram_and_cache_counters(self):
+        """Запросы, гистограмма по имени URL, SQL и кеш видны в /metrics."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        body = self.client.get(
+            reverse('metrics'),
+            HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('yatube_requests_total{method="GET",status="200",'
+                      'view="posts:index"} 2', body)
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      body)
+        self.assertIn('yatube_request_duration_seconds_count'
+                      '{view="posts:index"} 2', body)
+        self.assertLess(body.index('le="0.005"'), body.index('le="+Inf"'))
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', body)
+        self.assertIn('yatube_cache_requests_total{layer="shared",'
+                      'result="miss"}', body)
+        self.assertNotIn('view="metrics"', body)
+
+    def test_processes_are_summed(self):
+        """Файлы других процессов складываются; файл растёт по мере нужды."""
+        metrics.inc('yatube_db_queries_total', 2, view='x')
+        other = metrics._FileStore(os.path.join(self.directory, '1.db'))
+        other.inc('yatube_db_queries_total{view="x"}', 3)
+        for i in range(3000):
+            other.inc(f'yatube_db_queries_total{{view="v{i}"}}', 1)
+        values = metrics.collect()
+        self.assertEqual(values['yatube_db_queries_total{view="x"}'], 5)
+        self.assertEqual(values['yatube_db_queries_total{view="v2999"}'], 1)
+
+    def test_access_by_address_or_token(self):
+        """Чужому адресу без токена /metrics не отдаётся."""
+        url = reverse('metrics')
+        # За nginx каждый запрос приходит с адреса прокси.
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get(
+            url, REMOTE_ADDR='10.0.0.1',
+            HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        with override_settings(METRICS_ALLOWED_IPS=('10.0.0.0/8',)):
+            self.assertEqual(
+                self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code,
+                200)
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff', 's@x.ru', 'pass')
+        cls.user = User.objects.create_user('user')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(PROFILING_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        self.client.force_login(self.staff)
+        self.url = reverse('posts:index')
+
+    def test_signed_token_profiles_request(self):
+        """Запрос персонала с токеном сохраняет .pstats и запись."""
+        response = self.client.get(
+            self.url, {'_profile': profiling.token(self.staff)})
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.view_name, 'posts:index')
+        self.assertTrue(profile.file.endswith('.pstats'))
+        self.assertIn('function calls', profiling.summary(profile))
+
+    def test_requires_staff_and_valid_token(self):
+        """Чужой, битый токен или не staff — профиль не снимается."""
+        self.client.get(self.url, HTTP_X_PROFILE='1:bad:token')
+        self.client.get(self.url,
+                        HTTP_X_PROFILE=profiling.token(self.user))
+        self.client.force_login(self.user)
+        self.client.get(self.url,
+                        HTTP_X_PROFILE=profiling.token(self.user))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_sampler_samples_short_runs(self):
+        """Сэмплер снимает стек сразу, не дожидаясь интервала."""
+        sampler = profiling.Sampler(threading.get_ident(), 60)
+        sampler.start()
+        sampler.stop()
+        [(stack, count)] = sampler.stacks.items()
+        self.assertIn('test_sampler_samples_short_runs', stack)
+        self.assertEqual(count, 1)
+
+    @override_settings(PROFILING_MODE='sample',
+                       PROFILING_SAMPLE_INTERVAL=60)
+    def test_sampler_writes_collapsed_stacks(self):
+        """В режиме sample пишутся стеки в формате collapsed."""
+        self.client.get(self.url, HTTP_X_PROFILE=profiling.token(self.staff))
+        profile = RequestProfile.objects.get()
+        lines = profiling.summary(profile).splitlines()
+        self.assertTrue(profile.file.endswith('.collapsed'))
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertIn(';', stack)
+        self.assertGreater(int(count), 0)
+
+    def test_listed_in_admin(self):
+        """Профили видны в админке, там же выдаётся токен."""
+        self.client.get(self.url, HTTP_X_PROFILE=profiling.token(self.staff))
+        profile = RequestProfile.objects.get()
+        response = self.client.get(
+            reverse('admin:core_requestprofile_changelist'))
+        self.assertContains(response, profile.path)
+        self.assertContains(response, '_profile=')
+        response = self.client.get(reverse(
+            'admin:core_requestprofile_change', args=[profile.pk]))
+        self.assertContains(response, 'function calls')
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        Post.objects.bulk_create(Post(author=author, text=f'Пост {i}')
+                                 for i in range(15))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_records_plan_and_aggregates_by_shape_and_view(self):
+        """Запросы складываются по форме и представлению, с планом."""
+        self.client.get(reverse('posts:index'))
+        cache.clear()
+        self.client.get(reverse('posts:index'))
+        query = SlowQuery.objects.get(
+            view='posts.views.index',
+            fingerprint__contains='FROM "posts_post" INNER JOIN')
+        self.assertEqual(query.count, 2)
+        self.assertIn('LIMIT ?', query.fingerprint)
+        self.assertIn('posts_post', query.plan)
+        self.assertGreaterEqual(query.total_ms, query.max_ms)
+
+    def test_locked_database_does_not_break_response(self):
+        """Ошибка записи журнала не превращает ответ в 500."""
+        locked = OperationalError('database is locked')
+        with mock.patch('core.slowlog.record', side_effect=locked), \
+                self.assertLogs('core.slowlog', 'ERROR'):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_row_retried_once(self):
+        """Если строка так и не появилась, запись не зацикливается."""
+        with mock.patch.object(SlowQuery.objects, 'bulk_create') as create:
+            slowlog.record('view', 'SELECT 1', (), 1.0, '')
+        self.assertEqual(create.call_count, 1)
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_command_prints_top_offenders(self):
+        """slow_queries печатает топ и умеет очищать журнал."""
+        self.client.get(reverse('posts:index'))
+        out = StringIO()
+        call_command('slow_queries', '--view', 'posts.views.index',
+                     stdout=out)
+        self.assertIn('posts.views.index', out.getvalue())
+        self.assertIn('SELECT', out.getvalue())
+        call_command('slow_queries', '--reset', stdout=out)
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class SandboxTests(TestCase):
+    def test_cache_is_isolated(self):
+        """Замер в sandbox() не видит и не стирает рабочий кеш."""
+        cache.set('key', 'рабочее')
+        # Тестовые базы уже подняты самим прогоном тестов.
+        with mock.patch.multiple(
+                'core.sandbox', setup_test_environment=mock.DEFAULT,
+                setup_databases=mock.DEFAULT,
+                teardown_databases=mock.DEFAULT,
+                teardown_test_environment=mock.DEFAULT):
+            with sandbox():
+                self.assertIsNone(cache.get('key'))
+                cache.set('other', 'замер')
+                cache.clear()
+        self.assertEqual(cache.get('key'), 'рабочее')
+        self.assertIsNone(cache.get('other'))
+
+
+class TestSettingsTests(TestCase):
+    def test_runner_isolates_cache_and_thumbnails(self):
+        """Тесты идут с общим кешем в памяти и без фоновых миниатюр."""
+        self.assertIsInstance(caches['shared'], LocMemCache)
+        self.assertEqual(settings.THUMBNAIL_WORKER, 'off')
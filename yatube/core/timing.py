@@ -0,0 +1,149 @@
+"""Время фаз запроса: SQL, кеш, шаблон, context processors, миниатюры.
+
+ServerTimingMiddleware для доли запросов SERVER_TIMING_SAMPLE_RATE
+суммирует время и число вызовов каждой фазы и отдаёт их заголовком
+Server-Timing (видно во вкладке Network браузера) и записью лога
+core.timing с полями view, status и timings в extra. Фазы размечаются
+timed() и phase(); вне выборки это одно чтение ContextVar. Фазы
+вкладываются: SQL из шаблона попадает и в db, и в render.
+
+Шаблоны и context processors размечает бэкенд TimedDjangoTemplates:
+
+    TEMPLATES = [{'BACKEND': 'core.timing.TimedDjangoTemplates', ...}]
+"""
+import contextvars
+import functools
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('timings', default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def add(self, name, seconds):
+        entry = self.phases.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def as_dict(self):
+        return {name: {'ms': round(seconds * 1000, 3), 'count': count}
+                for name, (seconds, count) in self.phases.items()}
+
+    def header(self, total):
+        metrics = [f'{name};dur={seconds * 1000:.2f};desc="{count}"'
+                   for name, (seconds, count) in self.phases.items()]
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+def timed(name):
+    """Декоратор: время вызовов функции идёт в фазу name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.add(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def phase(name):
+    """То же для блока with."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def _db(execute, sql, params, many, context):
+    timings = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - started)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        self.rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 1.0)
+        if not self.rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.rate:
+            return self.get_response(request)
+        timings = Timings()
+        token = _current.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_db))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - timings.started
+        response['Server-Timing'] = timings.header(total)
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        logger.info('%s %s %.1f мс', request.method, request.path,
+                    total * 1000, extra={
+                        'view': view_name,
+                        'status': response.status_code,
+                        'timings': timings.as_dict(),
+                    })
+        return response
+
+
+class TimedTemplate(django_backend.Template):
+    @timed('render')
+    def render(self, context=None, request=None):
+        return super().render(context, request)
+
+
+class TimedDjangoTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates, размечающий render и context processors."""
+
+    def __init__(self, params):
+        super().__init__(params)
+        # cached_property движка: подменяем готовый список обёрнутым.
+        self.engine.template_context_processors = tuple(
+            timed('context_processors')(processor)
+            for processor in self.engine.template_context_processors)
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name),
+                                 self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Group, Post
+from . import search
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +10,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет через полнотекстовый индекс вместо LIKE '%...%'."""
+        if not search_term:
+            return queryset, False
+        ids = search.matching_ids(search_term)
+        return queryset.filter(pk__in=ids), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -0,0 +1,156 @@
+"""Замеры лент через тестовый клиент и сравнение с сохранённой базой.
+
+seed() заполняет базу bulk-вставками: посты распределены по авторам и
+группам, у читателей по fanout подписок с заполненной лентой, у
+последнего поста — комментарии. run() проходит index, group_list,
+profile, post_detail и follow_index с холодным кешем (перед каждым
+запросом cache.clear()) и с тёплым и считает перцентили времени и
+число SQL-запросов. compare() возвращает регрессии относительно
+базы. Запуск — manage.py benchmark_feeds, в отдельной тестовой базе
+и с отдельным кешем (core.sandbox).
+"""
+import random
+import time
+
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+
+from core.querycount import record
+
+from . import counters, timeline
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+SIZES = {
+    'small': {'posts': 1000, 'authors': 50, 'groups': 10, 'fanout': 20},
+    'medium': {'posts': 100000, 'authors': 1000, 'groups': 100,
+               'fanout': 200},
+    'large': {'posts': 1000000, 'authors': 10000, 'groups': 1000,
+              'fanout': 1000},
+}
+READERS = 5
+COMMENTS = 200
+
+
+def seed(posts, authors, groups, fanout, random_seed=0):
+    """Заполняет пустую базу; возвращает объекты для адресов замера."""
+    rng = random.Random(random_seed)
+    User.objects.bulk_create(
+        (User(username=f'author{i}') for i in range(authors)),
+        batch_size=BATCH_SIZE)
+    User.objects.bulk_create(
+        User(username=f'reader{i}') for i in range(READERS))
+    Group.objects.bulk_create(
+        (Group(title=f'Группа {i}', slug=f'group{i}', description='')
+         for i in range(groups)), batch_size=BATCH_SIZE)
+    author_ids = list(User.objects.filter(username__startswith='author')
+                      .values_list('pk', flat=True))
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    for start in range(0, posts, BATCH_SIZE):
+        Post.objects.bulk_create(
+            Post(author_id=rng.choice(author_ids),
+                 group_id=rng.choice(group_ids) if rng.random() < 0.7
+                 else None,
+                 text=f'Пост {i}')
+            for i in range(start, min(start + BATCH_SIZE, posts)))
+    readers = list(User.objects.filter(username__startswith='reader'))
+    followed = rng.sample(author_ids, min(fanout, len(author_ids)))
+    Follow.objects.bulk_create(
+        (Follow(user=reader, author_id=author_id)
+         for reader in readers for author_id in followed),
+        batch_size=BATCH_SIZE)
+    # bulk_create обходит сигналы: ленты и счётчики заполняем сами.
+    for reader in readers:
+        for author_id in followed:
+            timeline.backfill(reader.pk, author_id)
+    post = Post.objects.order_by('-pk').first()
+    Comment.objects.bulk_create(
+        (Comment(post=post, author_id=rng.choice(author_ids),
+                 text=f'Комментарий {i}') for i in range(COMMENTS)),
+        batch_size=BATCH_SIZE)
+    counters.reconcile()
+    return {
+        'reader': readers[0],
+        'post': post,
+        'author': User.objects.get(pk=rng.choice(author_ids)),
+        'group': Group.objects.get(pk=group_ids[0]),
+    }
+
+
+def urls(objects):
+    return {
+        'index': reverse('posts:index'),
+        'group_posts': reverse('posts:group_list',
+                               kwargs={'slug': objects['group'].slug}),
+        'profile': reverse('posts:profile',
+                           kwargs={'username': objects['author'].username}),
+        'post_detail': reverse('posts:post_detail',
+                               kwargs={'post_id': objects['post'].pk}),
+        'follow_index': reverse('posts:follow_index'),
+    }
+
+
+def percentile(ordered, p):
+    """Перцентиль с линейной интерполяцией между соседними замерами."""
+    position = (len(ordered) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def percentiles(timings):
+    ordered = sorted(timings)
+    return {
+        'p50': round(percentile(ordered, 50), 3),
+        'p95': round(percentile(ordered, 95), 3),
+        'p99': round(percentile(ordered, 99), 3),
+        'mean': round(sum(ordered) / len(ordered), 3),
+    }
+
+
+def measure(client, url, repeat, cold):
+    """Перцентили времени ответа в мс и число запросов к базе."""
+    timings = []
+    queries = 0
+    client.get(url)
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        with record() as log:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: ответ {response.status_code}')
+        queries = max(queries, log.count)
+    return {**percentiles(timings), 'queries': queries}
+
+
+def run(objects, repeat=20):
+    client = Client()
+    client.force_login(objects['reader'])
+    return {name: {mode: measure(client, url, repeat, mode == 'cold')
+                   for mode in ('cold', 'warm')}
+            for name, url in urls(objects).items()}
+
+
+def compare(results, baseline, threshold):
+    """Регрессии: p50/p95 выросли больше чем на threshold или запросов
+    стало больше."""
+    regressions = []
+    for name, modes in results.items():
+        for mode, current in modes.items():
+            old = baseline.get(name, {}).get(mode)
+            if old is None:
+                continue
+            if current['queries'] > old['queries']:
+                regressions.append(
+                    f'{name} {mode}: запросов {old["queries"]} → '
+                    f'{current["queries"]}')
+            for key in ('p50', 'p95'):
+                if current[key] > old[key] * (1 + threshold):
+                    regressions.append(
+                        f'{name} {mode}: {key} {old[key]:.2f} → '
+                        f'{current[key]:.2f} мс')
+    return regressions
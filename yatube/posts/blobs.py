@@ -0,0 +1,152 @@
+"""Учёт ссылок постов на файлы картинок и сборка мусора.
+
+С хранилищем по содержимому (core.storage) один файл может принадлежать
+многим постам, поэтому удалять его вместе с постом нельзя. Сигналы Post
+ведут ImageBlob.refs атомарными UPDATE; файл без ссылок дольше grace
+удаляет collect() вместе с миниатюрами. reconcile() пересчитывает ссылки
+по таблице постов после bulk-операций.
+
+Повторная загрузка того же содержимого не пишет файл, а обновляет его
+mtime (ContentAddressedStorage.save). Сборщик сначала переименовывает
+файл и смотрит mtime уже у переименованного: если загрузка успела его
+тронуть, файл возвращается на место, а если опоздала, то не найдёт
+файл и запишет его заново. Так пост не останется без картинки.
+"""
+import os
+import posixpath
+from itertools import chain
+from datetime import timedelta
+
+from django.apps import apps as django_apps
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import ImageBlob, Post
+
+IMAGE_DIR = 'posts'
+
+
+def _shift(name, delta):
+    updated = ImageBlob.objects.filter(name=name).update(
+        refs=Greatest(F('refs') + delta, Value(0)),
+        updated=timezone.now())
+    if not updated and delta > 0:
+        # Первая ссылка: строку создаём, гонку решает unique.
+        ImageBlob.objects.bulk_create([ImageBlob(name=name, refs=0)],
+                                      ignore_conflicts=True)
+        _shift(name, delta)
+
+
+def acquire(name):
+    if name:
+        _shift(name, 1)
+
+
+def release(name):
+    if name:
+        _shift(name, -1)
+
+
+def reconcile(apps=django_apps, dry_run=False):
+    """Пересчитывает refs по постам; возвращает число исправленных строк.
+
+    С dry_run только считает расхождения и ничего не пишет.
+    """
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    refs = dict(Post.objects.exclude(image='').order_by().values('image')
+                .annotate(n=Count('pk')).values_list('image', 'n'))
+    fixed = 0
+    if dry_run:
+        known = set(ImageBlob.objects.values_list('name', flat=True))
+        fixed = len(set(refs) - known)
+    else:
+        ImageBlob.objects.bulk_create(
+            (ImageBlob(name=name) for name in refs), batch_size=1000,
+            ignore_conflicts=True)
+    for blob in ImageBlob.objects.only('name', 'refs').iterator():
+        actual = refs.get(blob.name, 0)
+        if blob.refs == actual:
+            continue
+        if dry_run:
+            fixed += 1
+        else:
+            fixed += ImageBlob.objects.filter(pk=blob.pk).update(
+                refs=actual, updated=timezone.now())
+    return fixed
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for child in directories:
+        yield from _walk(storage, posixpath.join(directory, child))
+
+
+def _delete_file(storage, name, threshold):
+    """Удаляет файл и его миниатюры sorl, если файл не тронула загрузка.
+
+    Возвращает False, если файл остался на месте.
+    """
+    doomed = name + '.gc'
+    try:
+        os.replace(storage.path(name), storage.path(doomed))
+    except FileNotFoundError:
+        return False
+    if storage.get_modified_time(doomed) >= threshold:
+        os.replace(storage.path(doomed), storage.path(name))
+        return False
+    storage.delete(doomed)
+    default.kvstore.delete(ImageFile(name, storage))
+    return True
+
+
+def _unreferenced(storage, threshold, dry_run):
+    """Файлы строк ImageBlob с refs=0, не менявшихся с threshold."""
+    for name in (ImageBlob.objects.filter(refs=0, updated__lt=threshold)
+                 .values_list('name', flat=True).iterator()):
+        if not dry_run and not ImageBlob.objects.filter(
+                name=name, refs=0, updated__lt=threshold).delete()[0]:
+            # Пока шли по списку, на файл снова сослались.
+            continue
+        if storage.exists(name):
+            yield name
+
+
+def _untracked(storage, threshold):
+    """Старые файлы каталога картинок, о которых ImageBlob не знает."""
+    if not storage.exists(IMAGE_DIR):
+        return
+    known = set(ImageBlob.objects.values_list('name', flat=True))
+    for name in _walk(storage, IMAGE_DIR):
+        if name in known:
+            continue
+        try:
+            old = storage.get_modified_time(name) < threshold
+        except OSError:
+            continue
+        if old and not Post.objects.filter(image=name).exists():
+            yield name
+
+
+def collect(grace=timedelta(hours=1), dry_run=False):
+    """Удаляет файлы без ссылок; возвращает (удалено, байт освобождено).
+
+    Кандидаты — строки ImageBlob с refs=0, не менявшиеся дольше grace,
+    и файлы в каталоге картинок, о которых ImageBlob не знает.
+    """
+    storage = Post._meta.get_field('image').storage
+    threshold = timezone.now() - grace
+    removed = freed = 0
+    # chain ленив: каталог обходится после удаления файлов без ссылок.
+    for name in chain(_unreferenced(storage, threshold, dry_run),
+                      _untracked(storage, threshold)):
+        size = storage.size(name)
+        if dry_run or _delete_file(storage, name, threshold):
+            freed += size
+            removed += 1
+    return removed, freed
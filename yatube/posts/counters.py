@@ -0,0 +1,102 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются сигналами на создание и удаление Post, Comment и
+Follow атомарными UPDATE ... SET x = x + 1; расхождения, накопленные
+bulk-операциями, исправляет команда reconcile_counters.
+"""
+from django.apps import apps as django_apps
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Follow, Group, Post, UserCounter
+
+
+def _shift(queryset, field, delta):
+    """Сдвигает счётчик, не опуская его ниже нуля."""
+    return queryset.update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def bump_user(user_id, field, delta):
+    updated = _shift(UserCounter.objects.filter(user_id=user_id),
+                     field, delta)
+    if not updated and delta > 0:
+        # Строки ещё нет: считаем честно, объект уже записан в базу.
+        reconcile_users(user_ids=[user_id])
+
+
+def user_counter(user):
+    """Счётчики пользователя; недостающая строка создаётся пересчётом."""
+    try:
+        return user.counter
+    except UserCounter.DoesNotExist:
+        pass
+    # Зовётся из представлений: все три числа одним SELECT и одна
+    # вставка вместо пяти запросов reconcile_users.
+    counts = (type(user).objects.filter(pk=user.pk)
+              .annotate(n_posts=_count(Post, 'author'),
+                        n_followers=_count(Follow, 'author'),
+                        n_following=_count(Follow, 'user'))
+              .values_list('n_posts', 'n_followers', 'n_following').get())
+    counter = UserCounter(user=user, posts_count=counts[0],
+                          followers_count=counts[1],
+                          following_count=counts[2])
+    # Параллельный запрос мог успеть раньше — он посчитал то же самое.
+    UserCounter.objects.bulk_create([counter], ignore_conflicts=True)
+    return counter
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def bump_post(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def _count(model, fk, group_by='pk'):
+    """Подзапрос COUNT(*) по внешнему ключу fk, 0 при пустой выборке."""
+    subquery = (model.objects.filter(**{fk: OuterRef(group_by)})
+                .order_by().values(fk).annotate(n=Count('pk')).values('n'))
+    return Coalesce(Subquery(subquery), Value(0))
+
+
+def _fix(queryset, field, expression):
+    return queryset.exclude(**{field: expression}).update(
+        **{field: expression})
+
+
+def reconcile_users(user_ids=None, apps=django_apps):
+    User = apps.get_model('auth', 'User')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    UserCounter.objects.bulk_create(
+        (UserCounter(user_id=pk)
+         for pk in users.values_list('pk', flat=True).iterator()),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    counters = UserCounter.objects.filter(user__in=users)
+    return sum((
+        _fix(counters, 'posts_count', _count(Post, 'author', 'user')),
+        _fix(counters, 'followers_count', _count(Follow, 'author', 'user')),
+        _fix(counters, 'following_count', _count(Follow, 'user', 'user')),
+    ))
+
+
+def reconcile(apps=django_apps):
+    """Пересчитывает все счётчики; возвращает число исправленных строк."""
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    return {
+        'groups': _fix(Group.objects.all(), 'posts_count',
+                       _count(Post, 'group')),
+        'posts': _fix(Post.objects.all(), 'comments_count',
+                      _count(Comment, 'post')),
+        'users': reconcile_users(apps=apps),
+    }
@@ -0,0 +1,77 @@
+"""Версионированный кеш фрагментов лент index, group_posts и profile.
+
+Ключ фрагмента включает версию ленты и номер страницы (или курсор).
+Сигналы post_save/post_delete на Post увеличивают версии затронутых
+лент, поэтому старые фрагменты просто перестают читаться и TTL можно
+держать большим. Фрагменты показывают имена авторов и адреса групп,
+поэтому изменение User или Group тоже сбрасывает ленты с их постами.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Post
+
+
+def _version_key(scope):
+    return 'feed:version:' + ':'.join(str(part) for part in scope)
+
+
+def _initial_version():
+    # Версия от времени: если ключ версии вытеснят из кеша, новая версия
+    # не совпадёт со старыми фрагментами.
+    return int(time.time() * 1000)
+
+
+def feed_version(*scope):
+    return cache.get_or_set(_version_key(scope), _initial_version, None)
+
+
+def bump(*scope):
+    """Делает все закешированные фрагменты ленты устаревшими."""
+    try:
+        cache.incr(_version_key(scope))
+    except ValueError:
+        cache.set(_version_key(scope), _initial_version(), None)
+
+
+def bump_for_post(post, old_group_id=None):
+    bump('index')
+    bump('profile', post.author_id)
+    for group_id in {post.group_id, old_group_id} - {None}:
+        bump('group', group_id)
+
+
+def bump_for_author(user_id):
+    bump('index')
+    bump('profile', user_id)
+    groups = (Post.objects.filter(author_id=user_id, group__isnull=False)
+              .order_by().values_list('group_id', flat=True).distinct())
+    for group_id in groups:
+        bump('group', group_id)
+
+
+def bump_for_group(group_id):
+    bump('index')
+    bump('group', group_id)
+    authors = (Post.objects.filter(group_id=group_id)
+               .order_by().values_list('author_id', flat=True).distinct())
+    for author_id in authors:
+        bump('profile', author_id)
+
+
+def count_key(*scope):
+    """Ключ числа постов ленты; меняется вместе с версией ленты."""
+    return 'feed:count:{}:{}'.format(
+        ':'.join(str(part) for part in scope), feed_version(*scope))
+
+
+def feed_cache_context(request, *scope):
+    """Переменные для {% cache feed_timeout ... feed_version feed_page %}."""
+    return {
+        'feed_timeout': getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60),
+        'feed_version': feed_version(*scope),
+        'feed_page': (request.GET.get('cursor')
+                      or request.GET.get('page') or '1'),
+    }
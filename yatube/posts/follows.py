@@ -0,0 +1,44 @@
+"""Подписки: идемпотентные подписка и отписка, в том числе пачками.
+
+Пара (user, author) уникальна на уровне базы, поэтому подписка — это
+bulk_create(ignore_conflicts=True): повторный или параллельный запрос
+не создаёт дублей и не падает. bulk_create не шлёт сигналов, поэтому
+счётчики здесь пересчитываются по факту, а лента досыпается только
+для авторов, на которых подписки раньше не было. Отписка удаляет
+строки обычным delete(), и сигналы делают остальное.
+"""
+from . import counters, timeline
+from .models import Follow
+
+
+def _ids(users):
+    return {getattr(user, 'pk', user) for user in users}
+
+
+def follow(user, authors):
+    """Подписывает user на authors; возвращает id новых авторов."""
+    author_ids = _ids(authors) - {user.pk}
+    if not author_ids:
+        return set()
+    existing = set(Follow.objects.filter(user=user, author_id__in=author_ids)
+                   .values_list('author_id', flat=True))
+    new = author_ids - existing
+    Follow.objects.bulk_create(
+        (Follow(user=user, author_id=author_id) for author_id in new),
+        batch_size=timeline.BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    if new:
+        # Пересчёт, а не +1: параллельная подписка могла вставить ту же пару.
+        counters.reconcile_users(user_ids=[user.pk, *new])
+    for author_id in new:
+        timeline.forget_celebrity(author_id)
+        timeline.backfill(user.pk, author_id)
+    return new
+
+
+def unfollow(user, authors):
+    """Отписывает user от authors; возвращает число удалённых подписок."""
+    deleted, _ = Follow.objects.filter(
+        user=user, author_id__in=_ids(authors)).delete()
+    return deleted
@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from .image_ingest import normalize
 from .models import Post, Comment
 from django.utils.translation import gettext_lazy as _
 
@@ -17,6 +20,21 @@ class PostForm(forms.ModelForm):
         text = self.cleaned_data['text']
         return text
 
+    def clean_image(self):
+        """Новую картинку уменьшаем и перекодируем до сохранения."""
+        image = self.cleaned_data['image']
+        self.bytes_saved = 0
+        if isinstance(image, UploadedFile):
+            try:
+                image = normalize(image)
+            except (OSError, Image.DecompressionBombError):
+                raise forms.ValidationError(
+                    _('Не удалось прочитать картинку: файл повреждён '
+                      'или слишком велик.'),
+                    code='invalid_image')
+            self.bytes_saved = image.bytes_saved
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,78 @@
+"""Кеш горячих объектов: групп по slug и авторов по username.
+
+При двухуровневом кеше такие объекты читаются из памяти процесса.
+Записи сбрасываются сигналами при сохранении и удалении объектов,
+после переименования — и под прежним slug или username.
+От пользователя в кеше только поля, которые показывают страницы:
+пароль и почта в общий кеш не попадают.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404
+
+from .models import Group, User
+
+TIMEOUT = 60 * 60
+# Порядок как у полей модели: так их ждёт Model.from_db.
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+
+def _key(kind, value):
+    # slug и username могут содержать пробелы и не-ASCII символы.
+    digest = hashlib.md5(value.encode()).hexdigest()
+    return f'hot:{kind}:{digest}'
+
+
+def _group_key(slug):
+    return _key('group', slug)
+
+
+def _user_key(username):
+    return _key('user', username)
+
+
+def _first_or_404(queryset, **lookup):
+    obj = queryset.filter(**lookup).first()
+    if obj is None:
+        raise Http404(f'No {queryset.model._meta.object_name} matches '
+                      'the given query.')
+    return obj
+
+
+def _get_or_404(key, queryset, **lookup):
+    obj = cache.get(key)
+    if obj is None:
+        obj = _first_or_404(queryset, **lookup)
+        cache.set(key, obj, TIMEOUT)
+    return obj
+
+
+def group_by_slug(slug):
+    return _get_or_404(_group_key(slug), Group.objects, slug=slug)
+
+
+def user_by_username(username):
+    """Автор по username; остальные поля догружаются при обращении."""
+    key = _user_key(username)
+    values = cache.get(key)
+    if values is not None:
+        return User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+    # Счётчики приходят тем же запросом, что и автор.
+    user = _first_or_404(User.objects.select_related('counter'),
+                         username=username)
+    cache.set(key, [getattr(user, field) for field in USER_FIELDS], TIMEOUT)
+    return user
+
+
+def forget_group(group, old_slug=None):
+    """Сбрасывает группу под текущим и, после переименования, прежним
+    slug: иначе старый адрес ещё TIMEOUT секунд отдавал бы страницу."""
+    cache.delete_many({_group_key(slug) for slug in (group.slug, old_slug)
+                       if slug})
+
+
+def forget_user(user, old_username=None):
+    cache.delete_many({_user_key(name)
+                       for name in (user.username, old_username) if name})
@@ -0,0 +1,101 @@
+"""Нормализация картинок, загружаемых через PostForm.
+
+Фото с телефона весят мегабайты и каждый раз заново декодируются при
+нарезке миниатюр. До записи в хранилище картинка поворачивается по
+EXIF, уменьшается до POST_IMAGE_MAX_SIZE, теряет EXIF и прочие
+метаданные и кодируется в POST_IMAGE_FORMAT (прогрессивный JPEG или
+WebP) с качеством POST_IMAGE_QUALITY. Результат пишется одним проходом
+во временный файл, который держится в памяти до
+FILE_UPLOAD_MAX_MEMORY_SIZE; в MEDIA_ROOT он попадает только при
+сохранении поста. Анимированные картинки не трогаются, как и картинки,
+которые после перекодирования стали бы больше, если их не пришлось
+поворачивать, уменьшать или чистить от EXIF.
+"""
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'WEBP': ('.webp', 'image/webp'),
+}
+
+
+def _options():
+    fmt = getattr(settings, 'POST_IMAGE_FORMAT', 'JPEG').upper()
+    if fmt not in FORMATS:
+        raise ValueError(f'POST_IMAGE_FORMAT: неизвестный формат {fmt}')
+    if fmt == 'WEBP' and not features.check('webp'):
+        logger.warning('Pillow собран без WebP, картинки будут в JPEG')
+        fmt = 'JPEG'
+    return (fmt,
+            getattr(settings, 'POST_IMAGE_MAX_SIZE', (2560, 2560)),
+            getattr(settings, 'POST_IMAGE_QUALITY', 85))
+
+
+def _flatten(image, fmt):
+    """RGB для JPEG (прозрачность — на белом), RGB/RGBA для WebP."""
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+    if has_alpha and fmt == 'WEBP':
+        return image.convert('RGBA')
+    if has_alpha:
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _as_is(upload):
+    upload.seek(0)
+    upload.bytes_saved = 0
+    return upload
+
+
+def normalize(upload):
+    """Новый UploadedFile с нормализованной картинкой или upload как есть.
+
+    Возвращённый файл несёт атрибут bytes_saved. Битый файл или
+    слишком большая картинка дают OSError или DecompressionBombError.
+    """
+    fmt, max_size, quality = _options()
+    upload.seek(0)
+    with Image.open(upload) as source:
+        if getattr(source, 'is_animated', False):
+            return _as_is(upload)
+        original_size = source.size
+        # Оригинал можно оставить, только если в нём нечего менять.
+        pristine = 'exif' not in source.info
+        # draft сразу декодирует JPEG в уменьшенном масштабе.
+        source.draft('RGB', max_size)
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail(max_size, Image.LANCZOS)
+        image = _flatten(image, fmt)
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    options = {'quality': quality}
+    if fmt == 'JPEG':
+        options.update(progressive=True, optimize=True)
+    else:
+        options.update(method=4)
+    # exif и icc_profile не передаются — метаданные не сохраняются.
+    image.save(output, fmt, **options)
+    size = output.tell()
+    if pristine and image.size == original_size and size >= upload.size:
+        output.close()
+        return _as_is(upload)
+    output.seek(0)
+    extension, content_type = FORMATS[fmt]
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    result = UploadedFile(output, name, content_type, size)
+    result.bytes_saved = upload.size - size
+    logger.info('Картинка %s: %d -> %d байт, сэкономлено %d',
+                upload.name, upload.size, size, result.bytes_saved)
+    return result
@@ -0,0 +1,56 @@
+"""Метаданные картинки поста, снимаемые один раз при загрузке.
+
+Размеры, преобладающий цвет и крошечное превью (PNG не больше
+PLACEHOLDER_SIZE точек в data URI) хранятся на Post. Шаблоны резервируют
+место и рисуют размытую заглушку, не открывая файл с диска. width_field
+у ImageField не используется: он читает файл в post_init каждой
+загруженной строки, где размеры ещё не заполнены.
+"""
+import base64
+from io import BytesIO
+
+from PIL import Image
+
+PLACEHOLDER_SIZE = 8
+# Для поиска преобладающего цвета хватает уменьшенной копии.
+SAMPLE_SIZE = 64
+PALETTE = 5
+
+
+def describe(file):
+    """Словарь width, height, color и placeholder для файла картинки."""
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        # Для JPEG draft декодирует сразу в уменьшенном масштабе.
+        image.draft('RGB', (SAMPLE_SIZE, SAMPLE_SIZE))
+        sample = image.convert('RGB')
+    file.seek(0)
+    sample.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+    palette = sample.quantize(PALETTE)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    tiny = sample.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = BytesIO()
+    tiny.save(buffer, 'PNG', optimize=True)
+    return {
+        'width': width,
+        'height': height,
+        'color': f'#{red:02x}{green:02x}{blue:02x}',
+        'placeholder': 'data:image/png;base64,'
+                       + base64.b64encode(buffer.getvalue()).decode(),
+    }
+
+
+def fill(post):
+    """Заполняет поля метаданных поста по его картинке."""
+    if not post.image:
+        post.image_width = post.image_height = None
+        post.image_color = post.image_placeholder = ''
+        return
+    meta = describe(post.image.file)
+    post.image_width = meta['width']
+    post.image_height = meta['height']
+    post.image_color = meta['color']
+    post.image_placeholder = meta['placeholder']
@@ -0,0 +1,68 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sandbox import sandbox
+from posts import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Замеряет ленты на сгенерированных данных в отдельной тестовой '
+            'базе и сравнивает с сохранённой базой замеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=benchmarks.SIZES,
+                            default='small')
+        parser.add_argument('--posts', type=int)
+        parser.add_argument('--authors', type=int)
+        parser.add_argument('--groups', type=int)
+        parser.add_argument('--fanout', type=int,
+                            help='На скольких авторов подписан читатель.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--baseline', default=os.path.join(
+            settings.BASE_DIR, 'benchmark_baseline.json'))
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый рост p50/p95, доля.')
+        parser.add_argument('--save', action='store_true',
+                            help='Записать результат как новую базу.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть не меньше 1')
+        params = dict(benchmarks.SIZES[options['size']])
+        for name in params:
+            if options[name] is not None:
+                params[name] = options[name]
+        results = self._run(params, options['repeat'])
+        for name, modes in results.items():
+            for mode, result in modes.items():
+                self.stdout.write(
+                    f'{name:13} {mode:5} p50 {result["p50"]:8.2f} '
+                    f'p95 {result["p95"]:8.2f} p99 {result["p99"]:8.2f} мс, '
+                    f'запросов {result["queries"]}')
+        key = '-'.join(f'{name}{value}' for name, value in params.items())
+        baselines = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as file:
+                baselines = json.load(file)
+        if options['save']:
+            baselines[key] = {'params': params, 'results': results}
+            with open(options['baseline'], 'w') as file:
+                json.dump(baselines, file, indent=2, ensure_ascii=False)
+            self.stdout.write(f'база сохранена: {options["baseline"]}')
+            return
+        if key not in baselines:
+            raise CommandError(f'нет базы для {key}, запустите с --save')
+        regressions = benchmarks.compare(
+            results, baselines[key]['results'], options['threshold'])
+        if regressions:
+            raise CommandError('регрессии:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('регрессий нет'))
+
+    def _run(self, params, repeat):
+        # Данные и кеш — одноразовые, рабочие база и кеш не трогаются.
+        with sandbox():
+            objects = benchmarks.seed(**params)
+            return benchmarks.run(objects, repeat)
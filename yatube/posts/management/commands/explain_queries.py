@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.sandbox import sandbox
+from posts import query_plans
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает планы и время горячих запросов лент со старыми '
+            'индексами FK и с составными индексами на сгенерированных '
+            'данных в отдельной тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=10000,
+                            help='Сколько постов сгенерировать для замера.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Сколько раз выполнять каждый запрос.')
+
+    def handle(self, *args, **options):
+        with sandbox():
+            results = query_plans.compare(seed_posts=options['seed'],
+                                          repeat=options['repeat'])
+        for name, (plan_before, ms_before,
+                   plan_after, ms_after) in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f'  до ({ms_before:.3f} мс):')
+            self.stdout.write(_indent(plan_before))
+            self.stdout.write(f'  после ({ms_after:.3f} мс):')
+            self.stdout.write(_indent(plan_after))
+
+
+def _indent(plan):
+    return '\n'.join('    ' + line for line in plan.splitlines())
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы картинок, на которые не ссылается ни один пост, '
+            'вместе с их миниатюрами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=float, default=1,
+                            help='Не трогать файлы моложе стольких часов.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, ничего не удалять.')
+        parser.add_argument('--no-reconcile', action='store_true',
+                            help='Не пересчитывать ссылки перед сборкой.')
+
+    def handle(self, *args, **options):
+        if not options['no_reconcile']:
+            fixed = blobs.reconcile(dry_run=options['dry_run'])
+            verb = 'к исправлению' if options['dry_run'] else 'исправлено'
+            self.stdout.write(f'ссылки: {verb} строк {fixed}')
+        removed, freed = blobs.collect(
+            grace=timedelta(hours=options['grace']),
+            dry_run=options['dry_run'])
+        verb = 'к удалению' if options['dry_run'] else 'удалено'
+        self.stdout.write(
+            f'файлов {verb} {removed}, {freed / 2 ** 20:.1f} МБ')
@@ -0,0 +1,116 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def _rebuild_one(job):
+    """Выполняется в дочернем процессе; ошибки возвращает, а не бросает."""
+    name, force = job
+    try:
+        return name, thumbnails.rebuild(name, force), None
+    except Exception as error:
+        return name, None, f'{type(error).__name__}: {error}'
+
+
+def _init_worker():
+    # Соединения родителя после fork использовать нельзя.
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Перерезает миниатюры картинок постов пулом процессов. '
+            'Прерванный запуск продолжается с последнего чанка.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=os.cpu_count() or 1,
+                            help='Число процессов; 0 — в этом процессе.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--force', action='store_true',
+                            help='Резать и свежие миниатюры.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать с начала, забыв о прошлом запуске.')
+        parser.add_argument(
+            '--state',
+            default=os.path.join(settings.MEDIA_ROOT, 'cache',
+                                 'rebuild_thumbnails.json'),
+            help='Файл с последним обработанным id поста.')
+
+    def _load_state(self, path, restart):
+        if restart or not os.path.exists(path):
+            return 0
+        with open(path) as state:
+            return json.load(state).get('last_id', 0)
+
+    def _save_state(self, path, last_id):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as state:
+            json.dump({'last_id': last_id}, state)
+        os.replace(path + '.tmp', path)
+
+    def _chunks(self, start, size):
+        """Пары (id, имя картинки) чанками, по возрастанию id."""
+        last_id = start
+        while True:
+            chunk = list(
+                Post.objects.exclude(image='').filter(pk__gt=last_id)
+                .order_by('pk').values_list('pk', 'image')[:size])
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1][0]
+
+    def handle(self, *args, **options):
+        state = options['state']
+        start = self._load_state(state, options['restart'])
+        if start:
+            self.stdout.write(f'Продолжаю после поста {start}')
+        pool = None
+        if options['workers'] > 0:
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                options['workers'],
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker)
+        run = pool.map if pool else map
+        built = skipped = 0
+        failures = []
+        started = time.monotonic()
+        try:
+            for chunk in self._chunks(start, options['chunk_size']):
+                jobs = [(name, options['force']) for _, name in chunk]
+                for name, rebuilt, error in run(_rebuild_one, jobs):
+                    if error:
+                        failures.append((name, error))
+                    elif rebuilt:
+                        built += 1
+                    else:
+                        skipped += 1
+                self._save_state(state, chunk[-1][0])
+                done = built + skipped + len(failures)
+                rate = done / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f'пост {chunk[-1][0]}: обработано {done}, '
+                    f'{rate:.1f} картинок/с, ошибок {len(failures)}')
+        finally:
+            if pool:
+                pool.shutdown()
+        if os.path.exists(state):
+            os.remove(state)
+        elapsed = time.monotonic() - started
+        done = built + skipped + len(failures)
+        for name, error in failures:
+            self.stderr.write(f'{name}: {error}')
+        self.stdout.write(
+            f'Нарезано {built}, свежих {skipped}, ошибок {len(failures)} '
+            f'за {elapsed:.1f} с ({done / max(elapsed, 1e-6):.1f} '
+            f'картинок/с)')
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+def fill_image_meta(apps, schema_editor):
+    from django.core.files.storage import default_storage
+    from posts.image_meta import describe
+    Post = apps.get_model('posts', 'Post')
+    images = Post.objects.exclude(image='').values_list('pk', 'image')
+    for pk, name in images.iterator():
+        try:
+            with default_storage.open(name) as file:
+                meta = describe(file)
+        except (OSError, ValueError):
+            # Файла нет или он битый: поля останутся пустыми.
+            continue
+        Post.objects.filter(pk=pk).update(
+            image_width=meta['width'],
+            image_height=meta['height'],
+            image_color=meta['color'],
+            image_placeholder=meta['placeholder'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Превью картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.RunPython(fill_image_meta, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:41
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+def dedupe(apps, schema_editor):
+    """Оставляет по одной подписке на пару, удаляет подписки на себя."""
+    from posts.counters import reconcile_users
+    Follow = apps.get_model('posts', 'Follow')
+    keep = (Follow.objects.order_by().values('user', 'author')
+            .annotate(first=models.Min('pk')).values('first'))
+    duplicates = Follow.objects.exclude(pk__in=keep)
+    self_follows = Follow.objects.filter(
+        user=django.db.models.expressions.F('author'))
+    removed = duplicates.delete()[0] + self_follows.delete()[0]
+    if removed:
+        reconcile_users(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='follow_unique_user_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='follow_not_self'),
+        ),
+        # Старый индекс убираем после уникального, который его заменяет.
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follow_user_author_idx',
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -9,6 +10,9 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=20, unique=True)
     description = models.TextField(max_length=100)
+    posts_count = models.PositiveIntegerField('Число постов',
+                                              default=0,
+                                              editable=False)
 
     def __str__(self) -> str:
         return self.title
@@ -24,6 +28,7 @@ class Post(CreatedModel):
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
                                related_name='posts',
+                               db_index=False,
                                verbose_name='Автор',
                                help_text='Автор'
                                )
@@ -32,26 +37,67 @@ class Post(CreatedModel):
                               null=True,
                               on_delete=models.SET_NULL,
                               related_name='groups',
+                              db_index=False,
                               verbose_name='Сообщество',
                               help_text='Группа'
                               )
     image = models.ImageField('Картинка',
                               upload_to='posts/',
+                              storage=ContentAddressedStorage(),
                               blank=True,
                               )
+    image_width = models.PositiveIntegerField('Ширина картинки',
+                                              null=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField('Высота картинки',
+                                               null=True,
+                                               editable=False)
+    image_color = models.CharField('Основной цвет картинки',
+                                   max_length=7,
+                                   blank=True,
+                                   editable=False)
+    image_placeholder = models.TextField('Превью картинки',
+                                         blank=True,
+                                         editable=False)
+    comments_count = models.PositiveIntegerField('Число комментариев',
+                                                 default=0,
+                                                 editable=False)
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из базы: сигналы видят прежние группу и картинку
+        # без лишнего SELECT перед сохранением.
+        instance._loaded = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.__dict__.pop('_loaded', None)
+
     class Meta:
         ordering = ["-pub_date"]
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
+        # Ленты профиля и группы: фильтр по FK и сортировка по дате
+        # читаются из индекса без сортировки результата. Отдельные
+        # индексы FK (db_index=False) не нужны: их заменяет префикс
+        # составного, так же у Comment и Follow.
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_date_idx'),
+        ]
 
 
 class Comment(CreatedModel):
     post = models.ForeignKey(Post,
                              on_delete=models.CASCADE,
+                             db_index=False,
                              )
     author = models.ForeignKey(User,
                                related_name='comments',
@@ -65,12 +111,114 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(fields=['post', '-pub_date'],
+                         name='comment_post_date_idx'),
+        ]
 
 
 class Follow(models.Model):
     user = models.ForeignKey(User,
                              related_name='follower',
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE,
+                             db_index=False)
     author = models.ForeignKey(User,
                                related_name='following',
+                               on_delete=models.CASCADE,
+                               db_index=False)
+
+    class Meta:
+        # Уникальность (user, author) даёт и индекс для проверки подписки.
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='follow_unique_user_author'),
+            models.CheckConstraint(check=~models.Q(user=models.F('author')),
+                                   name='follow_not_self'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписчика."""
+    user = models.ForeignKey(User,
+                             related_name='timeline',
+                             on_delete=models.CASCADE)
+    post = models.ForeignKey(Post,
+                             related_name='timeline_entries',
+                             on_delete=models.CASCADE)
+    author = models.ForeignKey(User,
+                               related_name='+',
                                on_delete=models.CASCADE)
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-pub_date"]
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Ленты подписок"
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='timeline_user_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='timeline_unique_user_post'),
+        ]
+
+
+class UserCounter(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(User,
+                                primary_key=True,
+                                related_name='counter',
+                                on_delete=models.CASCADE)
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчики', default=0)
+    following_count = models.PositiveIntegerField('Подписки', default=0)
+
+    class Meta:
+        verbose_name = "Счётчики пользователя"
+        verbose_name_plural = "Счётчики пользователей"
+
+
+class PostTerm(models.Model):
+    """Обратный индекс для поиска, когда в SQLite нет FTS5."""
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post,
+                             related_name='terms',
+                             on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Термин поиска"
+        verbose_name_plural = "Поисковый индекс"
+        indexes = [
+            models.Index(fields=['term', 'post'],
+                         name='postterm_term_post_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'term'],
+                                    name='postterm_unique_post_term'),
+        ]
+
+
+class ImageBlob(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+    updated = models.DateTimeField('Изменён', auto_now=True)
+
+    class Meta:
+        verbose_name = "Файл картинки"
+        verbose_name_plural = "Файлы картинок"
+        indexes = [
+            models.Index(fields=['refs', 'updated'],
+                         name='imageblob_refs_updated_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
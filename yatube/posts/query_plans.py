@@ -0,0 +1,131 @@
+"""Планы и время горячих запросов лент — до и после составных индексов.
+
+Всё выполняется в транзакции, которая откатывается: seed() добавляет
+данные только на время замера, а схема «до» (одиночные индексы FK
+вместо составных) собирается и разбирается DDL внутри той же
+транзакции. Команда manage.py explain_queries запускает compare() в
+отдельной тестовой базе (core.sandbox): на SQLite транзакция с DDL
+держала бы блокировку записи рабочей базы весь замер.
+"""
+import random
+import statistics
+import time
+
+from django.db import connection, transaction
+from django.db.models import Count, Index
+
+from .models import Comment, Follow, Group, Post, User
+
+# Составные индексы и одиночные индексы FK, которые они заменили.
+COMPOSITE = {
+    Post: ('post_author_date_idx', 'post_group_date_idx'),
+    Comment: ('comment_post_date_idx',),
+    Follow: ('follow_author_user_idx',),
+}
+REPLACED = {
+    Post: ('author', 'group'),
+    Comment: ('post',),
+    Follow: ('author',),
+}
+
+
+def _busiest(queryset, field):
+    row = (queryset.exclude(**{f'{field}__isnull': True}).order_by()
+           .values(field).annotate(n=Count('pk')).order_by('-n').first())
+    return row and row[field]
+
+
+def hot_queries():
+    """Пары (название, queryset) для самых нагруженных автора, группы…"""
+    author = _busiest(Post.objects, 'author')
+    group = _busiest(Post.objects, 'group')
+    post = _busiest(Comment.objects, 'post')
+    reader = _busiest(Follow.objects, 'user')
+    followed = _busiest(Follow.objects, 'author')
+    return [
+        ('profile', Post.objects.filter(author_id=author)[:10]),
+        ('group_posts', Post.objects.filter(group_id=group)[:10]),
+        ('post_comments', Comment.objects.filter(post_id=post)[:10]),
+        ('is_following', Follow.objects.filter(user_id=reader,
+                                               author_id=followed)),
+        ('followers', Follow.objects.filter(author_id=followed)
+         .values_list('user_id', flat=True)),
+    ]
+
+
+def measure(queryset, repeat=20):
+    """План и медиана времени выполнения в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return queryset.explain(), statistics.median(timings)
+
+
+def _ddl(statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(str(statement))
+
+
+def use_old_indexes():
+    """Схема как до составных индексов; откатывается вместе с транзакцией."""
+    editor = connection.schema_editor()
+    statements = []
+    for model, names in COMPOSITE.items():
+        for index in model._meta.indexes:
+            if index.name in names:
+                statements.append(index.remove_sql(model, editor))
+        for field in REPLACED[model]:
+            name = f'bench_{model._meta.model_name}_{field}_idx'
+            index = Index(fields=[field], name=name)
+            statements.append(index.create_sql(model, editor))
+    _ddl(statements)
+
+
+def seed(posts, authors=50, groups=10, comments_per_post=5):
+    """Случайные данные: посты, комментарии и подписки через bulk_create."""
+    rng = random.Random(0)
+    # Данные живут только внутри откатываемой транзакции compare().
+    User.objects.bulk_create(
+        User(username=f'bench-{i}') for i in range(authors))
+    users = list(User.objects.filter(username__startswith='bench-'))
+    Group.objects.bulk_create(
+        Group(title=f'bench {i}', slug=f'bench-{i}', description='bench')
+        for i in range(groups))
+    group_objs = list(Group.objects.filter(slug__startswith='bench-'))
+    Post.objects.bulk_create(
+        (Post(author=rng.choice(users), group=rng.choice(group_objs + [None]),
+              text=f'bench {i}') for i in range(posts)))
+    post_ids = list(Post.objects.filter(text__startswith='bench ')
+                    .values_list('pk', flat=True))
+    Comment.objects.bulk_create(
+        (Comment(post_id=rng.choice(post_ids), author=rng.choice(users),
+                 text='bench') for _ in range(posts * comments_per_post)))
+    Follow.objects.bulk_create(
+        Follow(user=reader, author=author)
+        for reader in users for author in rng.sample(users, 10)
+        if reader != author)
+    if connection.vendor == 'sqlite':
+        _ddl(['ANALYZE'])
+
+
+def compare(seed_posts=0, repeat=20):
+    """{название: (план до, мс до, план после, мс после)}; БД не меняется."""
+    results = {}
+    with transaction.atomic():
+        if seed_posts:
+            seed(seed_posts)
+        after = {name: measure(qs, repeat) for name, qs in hot_queries()}
+        with transaction.atomic():
+            use_old_indexes()
+            if connection.vendor == 'sqlite':
+                _ddl(['ANALYZE'])
+            before = {name: measure(qs, repeat)
+                      for name, qs in hot_queries()}
+            transaction.set_rollback(True)
+        for name in after:
+            results[name] = before[name] + after[name]
+        transaction.set_rollback(True)
+    return results
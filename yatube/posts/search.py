@@ -0,0 +1,165 @@
+"""Полнотекстовый поиск по постам.
+
+В SQLite с FTS5 используется виртуальная таблица posts_post_fts и
+ранжирование bm25(). Без FTS5 (или при SEARCH_BACKEND='index') поиск
+идёт по обратному индексу PostTerm. В обоих случаях меньший score —
+лучше, а выдача листается курсором по (score, id). Индекс
+поддерживают сигналы Post; после bulk-операций или смены бэкенда
+нужен manage.py rebuild_search_index.
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (Case, Count, ExpressionWrapper, F, FloatField,
+                              Q, Sum, Value, When)
+
+from .models import Post, PostTerm
+from .utils import KeysetPage, KeysetPaginator, pack_cursor, unpack_cursor
+
+FTS_TABLE = 'posts_post_fts'
+MAX_TERMS = 8
+TERM_LENGTH = 64
+ADMIN_LIMIT = 1000
+
+_word = re.compile(r'\w+')
+_fts_ready = None
+
+
+def tokenize(text):
+    return [word[:TERM_LENGTH] for word in _word.findall(text.lower())]
+
+
+def fts_available():
+    """Есть ли таблица FTS5 (её создаёт миграция, если SQLite умеет)."""
+    global _fts_ready
+    if _fts_ready is None:
+        _fts_ready = (connection.vendor == 'sqlite' and FTS_TABLE in
+                      connection.introspection.table_names())
+    return _fts_ready
+
+
+def backend():
+    name = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        return 'fts5' if fts_available() else 'index'
+    return name
+
+
+def index_post(post):
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text])
+        return
+    PostTerm.objects.filter(post_id=post.pk).delete()
+    PostTerm.objects.bulk_create(
+        PostTerm(post_id=post.pk, term=term, count=count)
+        for term, count in Counter(tokenize(post.text)).items())
+
+
+def unindex_post(post):
+    # Строки PostTerm удаляет CASCADE.
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post.pk])
+
+
+def rebuild():
+    """Перестраивает индекс активного бэкенда целиком."""
+    if backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}')
+        return Post.objects.count()
+    PostTerm.objects.all().delete()
+    indexed = 0
+    for post in Post.objects.only('pk', 'text').iterator():
+        index_post(post)
+        indexed += 1
+    return indexed
+
+
+def _ranked_fts(terms, key, limit):
+    match = ' '.join('"{}"'.format(term.replace('"', '""'))
+                     for term in terms)
+    sql = (f'SELECT id, score FROM (SELECT rowid AS id, '
+           f'bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} '
+           f'WHERE {FTS_TABLE} MATCH %s)')
+    params = [match]
+    if key is not None:
+        sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+        params += [key[0], key[0], key[1]]
+    sql += ' ORDER BY score, id LIMIT %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+def _ranked_index(terms, key, limit):
+    terms = sorted(set(terms))
+    frequency = dict(
+        PostTerm.objects.filter(term__in=terms).values('term')
+        .annotate(n=Count('pk')).values_list('term', 'n'))
+    if len(frequency) < len(terms):
+        return []
+    # Редкие слова весят больше: score = -sum(tf / df).
+    weight = Sum(Case(
+        *[When(term=term, then=ExpressionWrapper(
+            F('count') * Value(-1.0 / frequency[term]),
+            output_field=FloatField()))
+          for term in terms],
+        output_field=FloatField(),
+    ))
+    rows = (PostTerm.objects.filter(term__in=terms).values('post')
+            .annotate(matched=Count('pk'), score=weight)
+            .filter(matched=len(terms)))
+    if key is not None:
+        rows = rows.filter(Q(score__gt=key[0])
+                           | Q(score=key[0], post__gt=key[1]))
+    # post_id, а не post: иначе Django подставит Post.Meta.ordering.
+    return list(rows.order_by('score', 'post_id')
+                .values_list('post', 'score')[:limit])
+
+
+def ranked(query, key=None, limit=10):
+    """Пары (id поста, score) в порядке релевантности после курсора."""
+    terms = tokenize(query)[:MAX_TERMS]
+    if not terms:
+        return []
+    if backend() == 'fts5':
+        return _ranked_fts(terms, key, limit)
+    return _ranked_index(terms, key, limit)
+
+
+def matching_ids(query, limit=ADMIN_LIMIT):
+    return [pk for pk, _ in ranked(query, limit=limit)]
+
+
+class SearchPaginator(KeysetPaginator):
+    """Выдача поиска страницами по курсору (score, id)."""
+
+    def get_page(self, cursor):
+        key = unpack_cursor(cursor) if cursor else None
+        try:
+            key = (float(key[0]), int(key[1])) if key else None
+        except (IndexError, TypeError, ValueError):
+            key = None
+        rows = ranked(self.object_list, key, self.per_page + 1)
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in rows])
+        next_cursor = None
+        if has_next:
+            last_pk, last_score = rows[-1]
+            next_cursor = pack_cursor(last_score, last_pk)
+        return KeysetPage([posts[pk] for pk, _ in rows if pk in posts],
+                          self, next_cursor=next_cursor)
@@ -0,0 +1,198 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (blobs, counters, feed_cache, hot_objects, image_meta,
+               search, timeline)
+from .models import Comment, Follow, Group, Post, User
+
+
+TRACKED = {'group', 'group_id', 'image'}
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_group(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежние группу и картинку поста для счётчиков."""
+    loaded = getattr(instance, '_loaded', {})
+    if instance._state.adding and instance.pk is None:
+        old = (None, '')
+    elif update_fields is not None and not TRACKED & set(update_fields):
+        old = (instance.group_id, instance.image.name)
+    elif 'group_id' in loaded and 'image' in loaded:
+        old = (loaded['group_id'], loaded['image'])
+    else:
+        # Объект не из базы или поля отложены: спрашиваем базу.
+        old = (Post.objects.filter(pk=instance.pk)
+               .values_list('group_id', 'image').first() or (None, ''))
+    instance._old_group_id, instance._old_image = old
+
+
+@receiver(post_save, sender=Post)
+def post_remember_saved(sender, instance, **kwargs):
+    """Записанные значения становятся прежними для следующего save()."""
+    instance._loaded = {**getattr(instance, '_loaded', {}),
+                        'group_id': instance.group_id,
+                        'image': instance.image.name}
+
+
+@receiver(pre_save, sender=Post)
+def post_image_meta(sender, instance, **kwargs):
+    """Снимает метаданные новой картинки, пока она ещё в памяти."""
+    if not instance.image or not instance.image._committed:
+        image_meta.fill(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_counters(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'posts_count', 1)
+        counters.bump_group(instance.group_id, 1)
+    elif instance._old_group_id != instance.group_id:
+        counters.bump_group(instance._old_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_delete_counters(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts_count', -1)
+    counters.bump_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def post_image_refs(sender, instance, **kwargs):
+    """Переносит ссылку поста со старого файла картинки на новый."""
+    if instance._old_image != instance.image.name:
+        blobs.release(instance._old_image)
+        blobs.acquire(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_delete_image_refs(sender, instance, **kwargs):
+    blobs.release(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_counters(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_delete_counters(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_counters(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'followers_count', 1)
+        counters.bump_user(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_delete_counters(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'followers_count', -1)
+    counters.bump_user(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def post_invalidate_feeds(sender, instance, **kwargs):
+    """Сбрасывает кеш лент, в которых виден пост."""
+    feed_cache.bump_for_post(instance, instance._old_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_delete_invalidate_feeds(sender, instance, **kwargs):
+    feed_cache.bump_for_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_index(sender, instance, **kwargs):
+    """Обновляет поисковый индекс поста."""
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_unindex(sender, instance, **kwargs):
+    search.unindex_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков."""
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, **kwargs):
+    """Заполняет ленту постами автора при подписке."""
+    if created:
+        timeline.forget_celebrity(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_prune(sender, instance, **kwargs):
+    """Чистит ленту при отписке, если других подписок на автора нет."""
+    timeline.forget_celebrity(instance.author_id)
+    timeline.demote_if_needed(instance.author_id)
+    if not Follow.objects.filter(user_id=instance.user_id,
+                                 author_id=instance.author_id).exists():
+        timeline.prune(instance.user_id, instance.author_id)
+
+
+def _previous(instance, field, update_fields):
+    """Значение field в базе до сохранения, если оно могло измениться."""
+    if instance.pk is None or (update_fields is not None
+                               and field not in update_fields):
+        return None
+    return (type(instance)._default_manager.filter(pk=instance.pk)
+            .values_list(field, flat=True).first())
+
+
+@receiver(pre_save, sender=Group)
+def group_remember_slug(sender, instance, update_fields=None, **kwargs):
+    """Прежний slug нужен, чтобы сбросить кеш под старым адресом."""
+    instance._old_slug = _previous(instance, 'slug', update_fields)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_forget(sender, instance, **kwargs):
+    hot_objects.forget_group(instance, getattr(instance, '_old_slug', None))
+
+
+def _login_only(update_fields):
+    """Сохранение из update_last_login при каждом входе."""
+    return update_fields == frozenset({'last_login'})
+
+
+@receiver(pre_save, sender=User)
+def user_remember_username(sender, instance, update_fields=None, **kwargs):
+    instance._old_username = _previous(instance, 'username', update_fields)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_forget(sender, instance, update_fields=None, **kwargs):
+    # Сброс ключа меняет поколение двухуровневого кеша во всех воркерах,
+    # а при входе показываемые поля не меняются.
+    if not _login_only(update_fields):
+        hot_objects.forget_user(
+            instance, getattr(instance, '_old_username', None))
+
+
+@receiver(post_save, sender=Group)
+def group_invalidate_feeds(sender, instance, created, **kwargs):
+    """Адрес и название группы есть во фрагментах лент."""
+    if not created:
+        feed_cache.bump_for_group(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_invalidate_feeds(sender, instance, created, update_fields=None,
+                          **kwargs):
+    """Имя автора есть во фрагментах лент; вход в систему не в счёт."""
+    if created or _login_only(update_fields):
+        return
+    feed_cache.bump_for_author(instance.pk)
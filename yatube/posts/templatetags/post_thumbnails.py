@@ -0,0 +1,27 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, geometry, **options):
+    """Готовая миниатюра или None; недостающую ставит в очередь.
+
+    {% post_thumbnail post.image "960x339" crop="center" as im %}
+    """
+    thumbnail = thumbnails.ready_thumbnail(image, geometry, **options)
+    if thumbnail is None and image:
+        thumbnails.enqueue(image.instance)
+    return thumbnail
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, geometry, **options):
+    """Готовые миниатюры всей страницы одним обращением к хранилищу.
+
+    {% prefetch_thumbnails page_obj "960x339" crop="center" %}
+    """
+    thumbnails.prefetch(posts, geometry, **options)
+    return ''
@@ -0,0 +1,71 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import benchmarks
+from posts.management.commands.benchmark_feeds import Command
+from posts.models import Follow, Post, TimelineEntry
+
+
+class BenchmarksTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_and_run(self):
+        """Генератор заполняет ленты, замер проходит все адреса."""
+        objects = benchmarks.seed(posts=60, authors=5, groups=2, fanout=3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Follow.objects.filter(
+            user=objects['reader']).count(), 3)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=objects['reader']).exists())
+        results = benchmarks.run(objects, repeat=2)
+        self.assertEqual(set(results), set(benchmarks.urls(objects)))
+        for modes in results.values():
+            self.assertEqual(set(modes), {'cold', 'warm'})
+            for result in modes.values():
+                self.assertGreater(result['p95'], 0)
+                self.assertLessEqual(result['p50'], result['p99'])
+        self.assertLessEqual(results['index']['warm']['queries'],
+                             results['index']['cold']['queries'])
+
+    def test_compare(self):
+        """Регрессией считается рост времени сверх порога и лишний запрос."""
+        old = {'index': {'cold': {'p50': 10.0, 'p95': 20.0, 'queries': 4}}}
+        same = {'index': {'cold': {'p50': 11.0, 'p95': 21.0, 'queries': 4}}}
+        worse = {'index': {'cold': {'p50': 13.0, 'p95': 21.0, 'queries': 5}}}
+        self.assertEqual(benchmarks.compare(same, old, 0.2), [])
+        regressions = benchmarks.compare(worse, old, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('запросов 4 → 5', regressions[0])
+        self.assertIn('p50', regressions[1])
+
+    def test_percentiles(self):
+        """Перцентили интерполируются между замерами, один замер — тоже."""
+        result = benchmarks.percentiles([4.0, 1.0, 3.0, 2.0, 5.0])
+        self.assertEqual(result, {'p50': 3.0, 'p95': 4.8, 'p99': 4.96,
+                                  'mean': 3.0})
+        self.assertEqual(benchmarks.percentiles([7.0]),
+                         {'p50': 7.0, 'p95': 7.0, 'p99': 7.0, 'mean': 7.0})
+
+    def test_command_requires_baseline(self):
+        """Без базы и без --save команда завершается ошибкой."""
+        results = {'index': {'cold': {'p50': 1.0, 'p95': 2.0, 'p99': 3.0,
+                                      'mean': 1.5, 'queries': 4}}}
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(Command, '_run', return_value=results):
+            baseline = os.path.join(directory, 'baseline.json')
+            with self.assertRaisesMessage(CommandError, 'нет базы'):
+                call_command('benchmark_feeds', '--baseline', baseline,
+                             stdout=StringIO())
+            call_command('benchmark_feeds', '--baseline', baseline, '--save',
+                         stdout=StringIO())
+            call_command('benchmark_feeds', '--baseline', baseline,
+                         stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, '--repeat'):
+            call_command('benchmark_feeds', '--repeat', '0')
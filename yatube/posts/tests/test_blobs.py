@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts import blobs, thumbnails
+from posts.models import ImageBlob, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageBlobTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def post(self, name='small.gif'):
+        return Post.objects.create(
+            author=self.user, text='Картинка',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'))
+
+    def refs(self, name):
+        return ImageBlob.objects.get(name=name).refs
+
+    def age(self, name):
+        """Делает файл и запись о нём старше grace."""
+        old = timezone.now() - timedelta(days=1)
+        ImageBlob.objects.filter(name=name).update(updated=old)
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.utime(path, (old.timestamp(), old.timestamp()))
+
+    def test_duplicates_share_one_file(self):
+        """Одинаковые картинки — один файл в шардированном каталоге."""
+        first = self.post('one.gif')
+        second = self.post('two.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertEqual(self.refs(first.image.name), 2)
+
+    def test_duplicate_reuses_thumbnail(self):
+        """Миниатюра первой загрузки сразу готова для дубликата."""
+        first = self.post()
+        thumbnails.generate(first.image.name)
+        second = self.post()
+        self.assertIsNotNone(thumbnails.ready_thumbnail(
+            second.image, '960x339', crop='center', upscale=True))
+
+    def test_refs_follow_posts(self):
+        """Удаление и замена картинки уменьшают счётчик ссылок."""
+        first = self.post()
+        second = self.post()
+        name = first.image.name
+        first.delete()
+        self.assertEqual(self.refs(name), 1)
+        second.image = None
+        second.save()
+        self.assertEqual(self.refs(name), 0)
+
+    def test_gc_keeps_referenced_and_young(self):
+        """Сборщик не трогает используемые и свежие файлы."""
+        post = self.post()
+        name = post.image.name
+        self.age(name)
+        self.assertEqual(blobs.collect(), (0, 0))
+        post.delete()
+        self.assertEqual(blobs.collect(), (0, 0))
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_gc_command_removes_orphans(self):
+        """Файл без ссылок и неучтённый файл удаляются командой."""
+        post = self.post()
+        name = post.image.name
+        post.delete()
+        self.age(name)
+        stray = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'stray.gif')
+        with open(stray, 'wb') as file:
+            file.write(SMALL_GIF)
+        os.utime(stray, (0, 0))
+        out = StringIO()
+        call_command('gc_media', stdout=out)
+        self.assertIn('файлов удалено 2', out.getvalue())
+        self.assertFalse(os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name)))
+        self.assertFalse(os.path.exists(stray))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_gc_spares_file_reused_by_upload(self):
+        """Загрузка того же содержимого во время сборки сохраняет файл."""
+        post = self.post()
+        name = post.image.name
+        post.delete()
+        self.age(name)
+        # Загрузка уже нашла файл, но ссылку ещё не записала.
+        Post._meta.get_field('image').storage.save(
+            'posts/again.gif', SimpleUploadedFile('again.gif', SMALL_GIF))
+        self.assertEqual(blobs.collect(), (0, 0))
+        self.assertTrue(os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name)))
+
+    def test_gc_dry_run_writes_nothing(self):
+        """--dry-run не пересчитывает ссылки и не удаляет строки."""
+        post = self.post()
+        name = post.image.name
+        Post.objects.filter(pk=post.pk).delete()
+        ImageBlob.objects.filter(name=name).update(refs=5)
+        out = StringIO()
+        call_command('gc_media', '--dry-run', stdout=out)
+        self.assertIn('ссылки: к исправлению строк 1', out.getvalue())
+        self.assertEqual(self.refs(name), 5)
+
+    def test_reconcile_after_bulk(self):
+        """reconcile считает ссылки, созданные в обход сигналов."""
+        name = self.post().image.name
+        Post.objects.bulk_create(
+            Post(author=self.user, text='Копия', image=name)
+            for _ in range(2))
+        self.assertEqual(blobs.reconcile(), 1)
+        self.assertEqual(self.refs(name), 3)
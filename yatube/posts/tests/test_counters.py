@@ -0,0 +1,86 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Comment, Follow, Group, Post, User, UserCounter
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counted')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='pot', slug='pot',
+                                         description='potny')
+        cls.group_sec = Group.objects.create(title='kot', slug='kot',
+                                             description='kotik')
+
+    def counter(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание и удаление поста меняют счётчики автора и группы."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        self.assertEqual(self.counter(self.user).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.group_sec
+        post.save()
+        self.group.refresh_from_db()
+        self.group_sec.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.group_sec.posts_count, 1)
+        post.delete()
+        self.assertEqual(self.counter(self.user).posts_count, 0)
+
+    def test_loaded_post_save_skips_lookup(self):
+        """Прежняя группа поста из базы берётся без лишнего SELECT."""
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        post = Post.objects.get(text='Пост')
+        post.group = self.group_sec
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        self.assertTrue(queries[0]['sql'].startswith('UPDATE'))
+        post.group = None
+        post.save()
+        self.group.refresh_from_db()
+        self.group_sec.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.group_sec.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Комментарии считаются на посте."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка меняет счётчики обеих сторон."""
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.counter(self.user).followers_count, 1)
+        self.assertEqual(self.counter(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.counter(self.user).followers_count, 0)
+        self.assertEqual(self.counter(self.reader).following_count, 0)
+
+    def test_reconcile_command_fixes_drift(self):
+        """reconcile_counters исправляет счётчики после bulk_create."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', group=self.group)
+            for i in range(3))
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+        self.assertEqual(self.counter(self.user).posts_count, 3)
+        self.assertIn('groups: исправлено строк 1', out.getvalue())
@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import follows
+from posts.models import Follow, Post, TimelineEntry, User, UserCounter
+
+
+class FollowsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other = User.objects.create_user(username='other')
+        cls.authors = [User.objects.create_user(username=f'author{i}')
+                       for i in range(3)]
+        cls.post = Post.objects.create(author=cls.authors[0], text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def counter(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_bulk_follow_is_idempotent(self):
+        """Повторная подписка не создаёт дублей и не сдвигает счётчики."""
+        new = follows.follow(self.reader, self.authors + [self.reader])
+        self.assertEqual(new, {author.pk for author in self.authors})
+        self.assertEqual(follows.follow(self.reader, self.authors), set())
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(self.counter(self.reader).following_count, 3)
+        self.assertEqual(self.counter(self.authors[0]).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.post).exists())
+
+    def test_unfollow_keeps_other_followers(self):
+        """Отписка удаляет только подписки самого пользователя."""
+        follows.follow(self.reader, self.authors)
+        follows.follow(self.other, self.authors[:1])
+        self.assertEqual(follows.unfollow(self.reader, self.authors[:2]), 2)
+        self.assertEqual(follows.unfollow(self.reader, self.authors[:2]), 0)
+        self.assertTrue(Follow.objects.filter(
+            user=self.other, author=self.authors[0]).exists())
+        self.assertEqual(self.counter(self.reader).following_count, 1)
+        self.assertEqual(self.counter(self.authors[0]).followers_count, 1)
+
+    def test_unfollow_view_keeps_other_followers(self):
+        """Отписка через страницу профиля не трогает чужие подписки."""
+        follows.follow(self.other, self.authors[:1])
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse('posts:profile_unfollow',
+                      kwargs={'username': self.authors[0].username})
+        client.get(url)
+        self.assertTrue(Follow.objects.filter(user=self.other).exists())
+
+    def test_database_rejects_duplicates_and_self_follow(self):
+        """Дубли и подписку на себя не пропускает сама база."""
+        Follow.objects.create(user=self.reader, author=self.other)
+        for author in (self.other, self.reader):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                Follow.objects.create(user=self.reader, author=author)
@@ -1,4 +1,14 @@
+import os
+import shutil
+import tempfile
 from http import HTTPStatus
+from io import BytesIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image, features
 from django.test import TestCase
 from posts.forms import PostForm
 from posts.models import Post, Group, User, Comment
@@ -118,3 +128,86 @@ class PostFormTests(TestCase):
         self.assertEqual(
             form_data['text'], last_comment
         )
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   POST_IMAGE_MAX_SIZE=(100, 100))
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def photo(self):
+        image = Image.new('RGB', (400, 200), (30, 120, 60))
+        exif = Image.Exif()
+        exif[0x0110] = 'Phone'
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=100, exif=exif.tobytes())
+        return SimpleUploadedFile('photo.jpeg', buffer.getvalue(),
+                                  'image/jpeg')
+
+    def test_create_normalizes_image(self):
+        """Картинка уменьшена, повёрнута, без EXIF и прогрессивная."""
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('posts:post_create'),
+                    data={'text': 'Фото', 'image': self.photo()})
+        post = Post.objects.get(text='Фото')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (50, 100))
+            self.assertFalse(stored.getexif())
+            self.assertTrue(stored.info.get('progressive'))
+
+    @skipUnless(features.check('webp'), 'Pillow собран без WebP')
+    @override_settings(POST_IMAGE_FORMAT='WEBP')
+    def test_webp_and_bytes_saved(self):
+        """Формат настраивается, экономия видна на форме."""
+        form = PostForm(data={'text': 'Фото'},
+                        files={'image': self.photo()})
+        self.assertTrue(form.is_valid(), form.errors)
+        image = form.cleaned_data['image']
+        self.assertEqual(image.name, 'photo.webp')
+        self.assertGreater(form.bytes_saved, 0)
+
+    def test_nothing_written_before_save(self):
+        """До сохранения поста в хранилище ничего не пишется."""
+        def stored():
+            return sum(len(files) for _, _, files in os.walk(TEMP_MEDIA_ROOT))
+
+        before = stored()
+        form = PostForm(data={'text': 'Фото'},
+                        files={'image': self.photo()})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertGreater(form.bytes_saved, 0)
+        self.assertEqual(stored(), before)
+
+    def test_truncated_image_is_form_error(self):
+        """Обрезанный файл — ошибка формы, а не 500."""
+        data = self.photo().read()
+        form = PostForm(data={'text': 'Фото'}, files={
+            'image': SimpleUploadedFile('cut.jpeg', data[:len(data) // 2],
+                                        'image/jpeg')})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_small_image_kept_when_reencoding_grows_it(self):
+        """Если перекодирование не помогает, остаётся оригинал."""
+        buffer = BytesIO()
+        Image.new('1', (64, 64), 1).save(buffer, 'PNG')
+        upload = SimpleUploadedFile('tiny.png', buffer.getvalue(),
+                                    'image/png')
+        form = PostForm(data={'text': 'Фото'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['image'].name, 'tiny.png')
+        self.assertEqual(form.bytes_saved, 0)
@@ -1,4 +1,5 @@
 from django.test import TestCase
+from .. import query_plans
 from ..models import Post, Group, User
 
 
@@ -54,3 +55,15 @@ class PostModelTest(TestCase):
                     post._meta.get_field(field).help_text,
                     value
                 )
+
+
+class QueryPlansTest(TestCase):
+    def test_compare_uses_composite_indexes_and_rolls_back(self):
+        """Запросы лент идут по составным индексам, база не меняется."""
+        results = query_plans.compare(seed_posts=50, repeat=1)
+        self.assertIn('post_author_date_idx', results['profile'][2])
+        self.assertIn('bench_post_author_idx', results['profile'][0])
+        self.assertIn('comment_post_date_idx', results['post_comments'][2])
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(User.objects.filter(
+            username__startswith='bench-').exists())
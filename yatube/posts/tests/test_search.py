@@ -0,0 +1,65 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, User
+
+
+class SearchMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.client_guest = Client()
+        cls.best = Post.objects.create(
+            author=cls.user, text='Кот и кот, снова кот')
+        cls.other = Post.objects.create(
+            author=cls.user, text='Кот и собака')
+        cls.miss = Post.objects.create(author=cls.user, text='Собака')
+        search.rebuild()
+
+    def search(self, query, **params):
+        return self.client_guest.get(reverse('posts:search'),
+                                     {'q': query, **params})
+
+    def test_ranked_results(self):
+        """Находятся только подходящие посты, лучший — первым."""
+        response = self.search('кот')
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.best, self.other])
+
+    def test_all_terms_required(self):
+        """Все слова запроса должны быть в посте."""
+        response = self.search('кот собака')
+        self.assertEqual(list(response.context['page_obj']), [self.other])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        post = Post.objects.create(author=self.user, text='Енот')
+        self.assertEqual(list(self.search('енот').context['page_obj']),
+                         [post])
+        post.text = 'Барсук'
+        post.save()
+        self.assertFalse(self.search('енот').context['page_obj'])
+        post.delete()
+        self.assertFalse(self.search('барсук').context['page_obj'])
+
+    def test_cursor_pagination(self):
+        """Курсор продолжает выдачу без повторов."""
+        for i in range(12):
+            Post.objects.create(author=self.user, text=f'Лиса {i}')
+        first = self.search('лиса').context['page_obj']
+        second = self.search(
+            'лиса', cursor=first.next_cursor).context['page_obj']
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(first) & set(second))
+
+
+class FtsSearchTest(SearchMixin, TestCase):
+    pass
+
+
+@override_settings(SEARCH_BACKEND='index')
+class IndexSearchTest(SearchMixin, TestCase):
+    pass
@@ -0,0 +1,206 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def upload(shade=0):
+    """Картинка; разный shade — разное содержимое и разные файлы."""
+    buffer = BytesIO()
+    Image.new('RGB', (2, 1), (shade, 0, 0)).save(buffer, 'GIF')
+    return SimpleUploadedFile('small.gif', buffer.getvalue(), 'image/gif')
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='painter')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='С картинкой',
+            image=upload())
+
+    def ready(self):
+        return thumbnails.ready_thumbnail(
+            self.post.image, '960x339', crop='center', upscale=True)
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюры нет, лента показывает заглушку, а не режет."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertIsNone(self.ready())
+
+    @override_settings(THUMBNAIL_WORKER='sync')
+    def test_generated_thumbnail_replaces_placeholder(self):
+        """После нарезки кеш ленты сброшен и виден тег img."""
+        self.client.get(reverse('posts:index'))
+        thumbnails._submit(self.post, self.post.image.name)
+        thumbnail = self.ready()
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+
+    @override_settings(THUMBNAIL_WORKER='sync')
+    def test_failure_not_retried_on_every_render(self):
+        """Битая картинка не режется заново при каждом показе."""
+        with mock.patch.object(thumbnails, 'generate',
+                               side_effect=OSError) as generate, \
+                mock.patch.object(thumbnails.transaction, 'on_commit',
+                                  side_effect=lambda func: func()), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            for page in (1, 2, 1):
+                self.client.get(reverse('posts:index'), {'page': page})
+        generate.assert_called_once_with(self.post.image.name)
+        self.assertTrue(thumbnails.failed_recently(self.post.image.name))
+
+    def test_prefetch_single_lookup(self):
+        """prefetch: один запрос на страницу, дальше хранилище не нужно."""
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user, text=f'Пост {i}',
+                image=upload(i + 1))
+            for i in range(3)]
+        thumbnails.generate(posts[1].image.name)
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts, '960x339', crop='center',
+                                upscale=True)
+        with mock.patch.object(thumbnails.default.kvstore, 'get') as get:
+            ready = [thumbnails.ready_thumbnail(
+                post.image, '960x339', crop='center', upscale=True)
+                for post in posts]
+        get.assert_not_called()
+        self.assertEqual([thumb is not None for thumb in ready],
+                         [False, True, False, False])
+        # Повторно всё берётся из кеша, в том числе отсутствие миниатюр.
+        with self.assertNumQueries(0):
+            thumbnails.prefetch(posts, '960x339', crop='center',
+                                upscale=True)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageMetaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='meta')
+
+    def upload(self):
+        image = Image.new('RGB', (40, 20), (200, 10, 10))
+        image.paste((10, 10, 200), (0, 0, 8, 20))
+        buffer = BytesIO()
+        image.save(buffer, 'PNG')
+        return SimpleUploadedFile('meta.png', buffer.getvalue(), 'image/png')
+
+    def test_meta_filled_on_upload(self):
+        """Размеры, цвет и превью сохраняются вместе с постом."""
+        post = Post.objects.create(author=self.user, text='Мета',
+                                   image=self.upload())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+        self.assertEqual(post.image_color, '#c80a0a')
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,'))
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_no_disk_reads(self):
+        """Загрузка поста и рендер ленты не открывают файл картинки."""
+        Post.objects.create(author=self.user, text='Мета',
+                            image=self.upload())
+        cache.clear()
+        with mock.patch.object(FileSystemStorage, 'open') as opened:
+            response = self.client.get(reverse('posts:index'))
+        opened.assert_not_called()
+        self.assertContains(response, 'background: #c80a0a url(')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RebuildThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='rebuilder')
+
+    def setUp(self):
+        cache.clear()
+        self.posts = [
+            Post.objects.create(
+                author=self.user, text=f'Пост {i}',
+                image=upload(i + 1))
+            for i in range(3)]
+        self.state = os.path.join(TEMP_MEDIA_ROOT, 'rebuild.json')
+
+    def rebuild(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('rebuild_thumbnails', '--workers=0', '--chunk-size=2',
+                     f'--state={self.state}', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_builds_then_skips_fresh(self):
+        """Второй запуск не режет уже готовые миниатюры."""
+        out, _ = self.rebuild()
+        self.assertIn('Нарезано 3, свежих 0, ошибок 0', out)
+        out, _ = self.rebuild()
+        self.assertIn('Нарезано 0, свежих 3, ошибок 0', out)
+        self.assertFalse(os.path.exists(self.state))
+
+    def test_resumes_after_interruption(self):
+        """Посты до сохранённого id пропускаются."""
+        with open(self.state, 'w') as state:
+            json.dump({'last_id': self.posts[1].pk}, state)
+        out, _ = self.rebuild()
+        self.assertIn(f'Продолжаю после поста {self.posts[1].pk}', out)
+        self.assertIn('Нарезано 1, свежих 0, ошибок 0', out)
+
+    def test_reports_failures(self):
+        """Битая картинка попадает в отчёт и не останавливает команду."""
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            image='posts/missing.gif')
+        with self.assertLogs('sorl.thumbnail', 'ERROR'):
+            out, err = self.rebuild()
+        self.assertIn('Нарезано 2, свежих 0, ошибок 1', out)
+        self.assertIn('posts/missing.gif', err)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKER='thread')
+class ThumbnailWorkerTest(TransactionTestCase):
+    def test_enqueue_after_commit(self):
+        """После коммита фоновый поток нарезает миниатюру."""
+        cache.clear()
+        post = Post.objects.create(
+            author=User.objects.create_user(username='worker'),
+            text='В очередь',
+            image=upload())
+        thumbnails.enqueue(post)
+        thumbnails.wait()
+        self.assertIsNotNone(thumbnails.ready_thumbnail(
+            post.image, '960x339', crop='center', upscale=True))
@@ -0,0 +1,162 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.querycount import QueryBudgetMixin
+from posts.models import Follow, Post, TimelineEntry, User
+from posts.timeline import catching_up, path_metrics
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.old_post = Post.objects.create(author=cls.author,
+                                           text='Старый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client_reader = Client()
+        self.client_reader.force_login(self.reader)
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+
+    def test_new_post_fanned_out(self):
+        """Новый пост попадает в ленту подписчика."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client_reader.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        self.client_reader.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.client_reader.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_follow_index_query_count_is_flat(self):
+        """Лента читается фиксированным числом запросов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(5):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        url = reverse('posts:follow_index')
+        self.client_reader.get(url)
+        cache.clear()
+        with self.assertNumQueries(7):
+            self.client_reader.get(url)
+
+
+@override_settings(TIMELINE_CELEBRITY_THRESHOLD=2)
+class HybridTimelineTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='writer')
+
+    def setUp(self):
+        cache.clear()
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client_reader = Client()
+        self.client_reader.force_login(self.reader)
+
+    def test_celebrity_posts_are_pulled(self):
+        """Посты знаменитости не пишутся в ленты, но видны в них."""
+        post = Post.objects.create(author=self.star, text='Звезда')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.client_reader.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_pushed_and_pulled_posts_merged_by_date(self):
+        """Лента сливает push- и pull-посты по дате."""
+        for i in range(6):
+            author = self.star if i % 2 else self.author
+            Post.objects.create(author=author, text=f'Пост {i}')
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        response = self.client_reader.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), expected)
+        cursor_page = self.client_reader.get(
+            reverse('posts:follow_index'), {'cursor': ''})
+        self.assertEqual(list(cursor_page.context['page_obj']), expected)
+
+    def test_deep_offset_page_merged(self):
+        """Дальние страницы по номеру сливаются так же, как первая."""
+        for i in range(25):
+            author = self.star if i % 3 else self.author
+            Post.objects.create(author=author, text=f'Пост {i}')
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        with self.assertQueryBudget(view_name='posts:follow_index'):
+            response = self.client_reader.get(
+                reverse('posts:follow_index'), {'page': 3})
+        self.assertEqual(list(response.context['page_obj']), expected[20:])
+
+    def test_several_celebrities_fit_budget(self):
+        """Посты всех знаменитостей читаются одним потоком."""
+        for i in range(4):
+            star = User.objects.create_user(username=f'star{i}')
+            Follow.objects.create(user=self.reader, author=star)
+            Follow.objects.create(user=self.fan, author=star)
+            for j in range(4):
+                Post.objects.create(author=star, text=f'Звезда {i}.{j}')
+        Post.objects.create(author=self.author, text='Обычный')
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        url = reverse('posts:follow_index')
+        for params in ({}, {'page': 2}, {'cursor': ''}):
+            cache.clear()
+            with self.subTest(**params), \
+                    self.assertQueryBudget(view_name='posts:follow_index'):
+                response = self.client_reader.get(url, params)
+            page = list(response.context['page_obj'])
+            offset = 10 if 'page' in params else 0
+            self.assertEqual(page, expected[offset:offset + 10])
+
+    def test_demoted_author_posts_caught_up(self):
+        """Посты, вышедшие в pull-режиме, не пропадают после понижения."""
+        post = Post.objects.create(author=self.star, text='Звезда')
+        self.client_reader.get(reverse('posts:follow_index'))
+        Follow.objects.filter(user=self.fan, author=self.star).delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        response = self.client_reader.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(TIMELINE_CELEBRITY_THRESHOLD=4,
+                       TIMELINE_CATCH_UP_ROWS=2)
+    def test_catch_up_is_bounded_per_call(self):
+        """Понижение досыпает ленты порциями, остальное — при чтении."""
+        others = [User.objects.create_user(username=f'other{i}')
+                  for i in range(2)]
+        for user in others:
+            Follow.objects.create(user=user, author=self.star)
+        posts = [Post.objects.create(author=self.star, text=f'Звезда {i}')
+                 for i in range(2)]
+        Follow.objects.filter(user=others[1], author=self.star).delete()
+        entries = TimelineEntry.objects.filter(author=self.star)
+        self.assertEqual(entries.count(), 2)
+        self.assertEqual(catching_up([self.star.pk]), {self.star.pk})
+        client = Client()
+        client.force_login(self.fan)
+        for _ in range(2):
+            response = client.get(reverse('posts:follow_index'))
+            self.assertEqual(list(response.context['page_obj']),
+                             posts[::-1])
+        self.assertEqual(catching_up([self.star.pk]), set())
+        self.assertEqual(entries.count(), 6)
+
+    def test_path_metrics(self):
+        """Путь сборки ленты попадает в метрики."""
+        self.client_reader.get(reverse('posts:follow_index'))
+        self.assertEqual(path_metrics()['hybrid'], 1)
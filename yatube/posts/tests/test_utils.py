@@ -60,3 +60,55 @@ class PostsViewTest(TestCase):
         response = self.authorized_client.get(
             reverse('posts:group_list', kwargs={'slug': self.post.group.slug}))
         self.assertEqual(len(response.context['page_obj']), Q_ON_PAGE_F)
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='cursor')
+        cls.client_auth = Client()
+        cls.client_auth.force_login(cls.user)
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Курсор_{i}')
+            for i in range(Quant_OF_POST)
+        )
+
+    def test_cursor_pages_cover_all_posts(self):
+        """Курсоры проходят ленту без пропусков и повторов."""
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = self.client_auth.get(
+                reverse('posts:profile',
+                        kwargs={'username': self.user.username}),
+                {'cursor': cursor})
+            page_obj = response.context['page_obj']
+            seen.extend(post.pk for post in page_obj)
+            cursor = page_obj.next_cursor
+        expected = list(
+            self.user.posts.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_first_page(self):
+        """Курсор назад возвращает предыдущую страницу."""
+        url = reverse('posts:profile',
+                      kwargs={'username': self.user.username})
+        first = self.client_auth.get(url, {'cursor': ''})
+        first_page = first.context['page_obj']
+        second = self.client_auth.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(len(second), Quant_OF_POST - Q_ON_PAGE_F)
+        back = self.client_auth.get(
+            url, {'cursor': second.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), list(first_page))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_gives_first_page(self):
+        """Битый курсор отдаёт первую страницу."""
+        response = self.client_auth.get(
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}),
+            {'cursor': '!!!'})
+        self.assertEqual(len(response.context['page_obj']), Q_ON_PAGE_F)
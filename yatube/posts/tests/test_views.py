@@ -1,9 +1,15 @@
 from django import forms
 from django.test import TestCase, Client, override_settings
-from posts.models import Group, Post, User, Follow
+from posts import hot_objects
+from posts.models import Comment, Group, Post, User, Follow, UserCounter
+from posts.utils import COMMENTS_PER_PAGE
+from core.querycount import QueryBudgetMixin
 from django.urls import reverse
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 import tempfile
+import hashlib
 import shutil
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -190,20 +196,54 @@ class PostsViewTest(TestCase):
         # Запрашиваю текущий вид главной страницы
         response = self.authorized_client.get(reverse('posts:index'))
         cache_mine = response.content
-        # Удаляю посты
-        test_post.delete()
-        test_post_o.delete()
-        test_post_s.delete()
+        # Меняю посты в обход сигналов
+        Post.objects.filter(
+            pk__in=[test_post.pk, test_post_o.pk, test_post_s.pk]
+        ).update(text='Изменено')
         # Запрошу тек-й вид глав стр
         response_sec = self.authorized_client.get(reverse('posts:index'))
-        # Сравню, что страницы одинаковы, несмотря на удаление постов
+        # Сравню, что страница взята из кеша
         self.assertEqual(cache_mine, response_sec.content)
-        # Очищаю кеш, в кот были удаленные посты
-        cache.clear()
+        # Удаляю посты: сигнал сбрасывает версию кеша ленты
+        test_post.delete()
+        test_post_o.delete()
+        test_post_s.delete()
         # Запрошу тек-й вид глав стр
         response_third = self.authorized_client.get(reverse('posts:index'))
         # Сравню кеш, в кот были удаленные посты и новый вид глав стр
         self.assertNotEqual(cache_mine, response_third.content)
+        self.assertNotContains(response_third, 'Изменено')
+
+    def test_index_cache_varies_by_page(self):
+        """Кеш главной страницы разный для разных страниц."""
+        cache.clear()
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Страница_{i}')
+            for i in range(10))
+        first = self.authorized_client.get(reverse('posts:index'))
+        second = self.authorized_client.get(
+            reverse('posts:index') + '?page=2')
+        self.assertNotEqual(first.content, second.content)
+
+    def test_feed_cache_follows_renames(self):
+        """Переименование автора или группы сбрасывает фрагменты лент."""
+        cache.clear()
+        author = User.objects.create(username='renamed', first_name='Иван')
+        group = Group.objects.create(title='Старая', slug='old-slug',
+                                     description='')
+        Post.objects.create(author=author, text='Пост', group=group)
+        group_url = reverse('posts:group_list', kwargs={'slug': 'old-slug'})
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.get(group_url)
+        author.first_name = 'Пётр'
+        author.save()
+        self.assertContains(self.guest_client.get(reverse('posts:index')),
+                            'Пётр')
+        self.assertContains(self.guest_client.get(group_url), 'Пётр')
+        group.slug = 'new-slug'
+        group.save()
+        self.assertContains(self.guest_client.get(reverse('posts:index')),
+                            'new-slug')
 
     def test_image_shown_index(self):
         """Проверяем вывод изображения на основной стр."""
@@ -233,10 +273,13 @@ class PostsViewTest(TestCase):
         post_image_pro = first_object_on_profile.image
         post_image_g = first_object_on_group.image
         post_image_pd = obj_on_pd.image
-        self.assertEqual(post_image_i, f'posts/{con.name}')
-        self.assertEqual(post_image_pro.name, f'posts/{con.name}')
-        self.assertEqual(post_image_g.name, f'posts/{con.name}')
-        self.assertEqual(post_image_pd.name, f'posts/{con.name}')
+        # Картинки хранятся по хешу содержимого
+        digest = hashlib.sha256(self.small_gif).hexdigest()
+        expected = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
+        self.assertEqual(post_image_i, expected)
+        self.assertEqual(post_image_pro.name, expected)
+        self.assertEqual(post_image_g.name, expected)
+        self.assertEqual(post_image_pd.name, expected)
 
     def test_view_follow_works(self):
         """Проверяем подписка создает запись в базе."""
@@ -297,3 +340,160 @@ class PostsViewTest(TestCase):
         print(tempfile.mkdtemp)
         shutil.rmtree(settings.MEDIA_ROOT)
         return super().tearDownClass()
+
+
+class PostDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse('posts:post_detail',
+                           kwargs={'post_id': self.post.pk})
+
+    def add_comments(self, count):
+        start = Comment.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create(username=f'commenter{i}')
+            Comment.objects.create(post=self.post, author=author,
+                                   text=f'Комментарий {i}')
+
+    def test_query_count_does_not_grow_with_comments(self):
+        """Число запросов не зависит от числа комментариев."""
+        self.add_comments(2)
+        self.client.get(self.url)
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        self.add_comments(COMMENTS_PER_PAGE + 5)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+
+    def test_comments_are_paginated_by_cursor(self):
+        """По курсору отдаются следующие, более старые комментарии."""
+        self.add_comments(COMMENTS_PER_PAGE + 5)
+        first = self.client.get(self.url).context['comments']
+        second = self.client.get(
+            self.url, {'comments': first.next_cursor}).context['comments']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+        self.assertFalse({c.pk for c in first} & {c.pk for c in second})
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class FeedQueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(username='reader')
+        groups = [Group.objects.create(title=f'Группа {i}', slug=f'g{i}',
+                                       description='Описание')
+                  for i in range(3)]
+        authors = [User.objects.create(username=f'author{i}')
+                   for i in range(4)]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for i in range(12):
+            cls.post = Post.objects.create(author=authors[i % 4],
+                                           group=groups[i % 3],
+                                           text=f'Пост {i}')
+        for i in range(5):
+            Comment.objects.create(post=cls.post, author=authors[i % 4],
+                                   text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_feeds_fit_budget_without_n_plus_one(self):
+        """Ленты с холодным кешем укладываются в бюджет и без N+1."""
+        urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse('posts:group_list',
+                                        kwargs={'slug': 'g0'}),
+            'posts:profile': reverse('posts:profile',
+                                     kwargs={'username': 'author0'}),
+            'posts:post_detail': reverse('posts:post_detail',
+                                         kwargs={'post_id': self.post.pk}),
+            'posts:follow_index': reverse('posts:follow_index'),
+            'posts:search': reverse('posts:search') + '?q=Пост',
+        }
+        for mode in ('offset', 'keyset'):
+            for view_name, url in urls.items():
+                cache.clear()
+                with self.subTest(mode=mode, view_name=view_name), \
+                        self.settings(POSTS_PAGINATION=mode), \
+                        self.assertQueryBudget(view_name=view_name):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_profile_without_counter_row_fits_budget(self):
+        """Строка счётчиков создаётся без выхода за бюджет."""
+        author = User.objects.create(username='bulk')
+        Post.objects.bulk_create(Post(author=author, text=f'Пост {i}')
+                                 for i in range(3))
+        url = reverse('posts:profile', kwargs={'username': 'bulk'})
+        for mode in ('offset', 'keyset'):
+            UserCounter.objects.filter(user=author).delete()
+            cache.clear()
+            with self.subTest(mode=mode), \
+                    self.settings(POSTS_PAGINATION=mode), \
+                    self.assertQueryBudget(view_name='posts:profile'):
+                response = self.client.get(url)
+            self.assertEqual(response.context['counter'].posts_count, 3)
+
+    def test_repeated_profile_stays_in_budget(self):
+        """Автор из горячего кеша — свежий объект без пароля."""
+        url = reverse('posts:profile', kwargs={'username': 'author0'})
+        for _ in range(3):
+            with self.assertQueryBudget(view_name='posts:profile'):
+                response = self.client.get(url)
+            self.assertEqual(response.context['counter'].posts_count, 3)
+        author = User.objects.get(username='author0')
+        self.assertEqual(cache.get(hot_objects._user_key('author0')),
+                         [author.pk, 'author0', '', ''])
+
+    def test_renamed_author_and_group_leave_cache(self):
+        """После переименования старые адреса отдают 404, а не кеш."""
+        old_profile = reverse('posts:profile', kwargs={'username': 'author1'})
+        old_group = reverse('posts:group_list', kwargs={'slug': 'g1'})
+        self.assertEqual(self.client.get(old_profile).status_code, 200)
+        self.assertEqual(self.client.get(old_group).status_code, 200)
+        author = User.objects.get(username='author1')
+        author.username = 'renamed'
+        author.save()
+        group = Group.objects.get(slug='g1')
+        group.slug = 'renamed'
+        group.save()
+        self.assertEqual(self.client.get(old_profile).status_code, 404)
+        self.assertEqual(self.client.get(old_group).status_code, 404)
+        self.assertEqual(self.client.get(reverse(
+            'posts:profile', kwargs={'username': 'renamed'})).status_code,
+            200)
+
+    def test_cached_fragment_skips_feed_queries(self):
+        """Из кеша фрагмента лента отдаётся без запросов к постам."""
+        feed_tables = ('"posts_post"', '"posts_follow"',
+                       '"posts_timelineentry"')
+        urls = (reverse('posts:index'), reverse('posts:follow_index'))
+        for mode in ('offset', 'keyset'):
+            cache.clear()
+            for url in urls:
+                with self.subTest(mode=mode, url=url), \
+                        self.settings(POSTS_PAGINATION=mode):
+                    first = self.client.get(url)
+                    with CaptureQueriesContext(connection) as queries:
+                        second = self.client.get(url)
+                    self.assertEqual(second.content, first.content)
+                    self.assertEqual(
+                        [query['sql'] for query in queries
+                         if any(table in query['sql']
+                                for table in feed_tables)], [])
@@ -0,0 +1,262 @@
+"""Миниатюры картинок постов вне цикла запроса.
+
+Первый показ поста с картинкой раньше резал её PIL-ом прямо в запросе.
+Теперь post_create/post_edit ставят картинку в очередь фонового
+потока, который нарезает все размеры из POST_THUMBNAILS, а шаблоны
+берут только готовую миниатюру из KV-хранилища sorl и до её появления
+показывают заглушку. Когда миниатюры готовы, версии лент с постом
+увеличиваются, и закешированные фрагменты с заглушкой перестают
+читаться.
+
+THUMBNAIL_WORKER: 'thread' — фоновый поток процесса, 'sync' — сразу в
+запросе (тесты, отладка), 'off' — очередь не ведётся, миниатюры режет
+команда rebuild_thumbnails.
+
+Картинку, которую нарезать не удалось, шаблоны не ставят в очередь
+повторно THUMBNAIL_RETRY_AFTER секунд: иначе каждый показ битой
+картинки снова запускал бы PIL.
+"""
+import hashlib
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import ThumbnailError
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core import metrics
+from core.timing import timed
+
+from . import feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+metrics.register('yatube_thumbnails_total', 'counter',
+                 'Нарезанные и не нарезанные миниатюры.')
+
+DEFAULT_GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+_queue = queue.Queue()
+_pending = set()
+_pending_lock = threading.Lock()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _failure_key(name):
+    return 'thumbnails:failed:' + hashlib.md5(name.encode()).hexdigest()
+
+
+def failed_recently(name):
+    """Нарезка name недавно падала, повторять пока рано."""
+    return cache.get(_failure_key(name)) is not None
+
+
+def geometries():
+    return getattr(settings, 'POST_THUMBNAILS', DEFAULT_GEOMETRIES)
+
+
+def _options(source, options):
+    """Опции в том виде, в каком их дополняет ThumbnailBackend."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def source(name):
+    """Исходник по имени — в том же хранилище, что у Post.image.
+
+    Ключи sorl включают класс хранилища, поэтому строка без него дала
+    бы другие имена миниатюр.
+    """
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def thumbnail_file(image, geometry, **options):
+    """ImageFile миниатюры без обращения к хранилищу и PIL."""
+    source = ImageFile(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, _options(source, options))
+    return ImageFile(name, default.storage)
+
+
+@timed('thumbnail')
+def ready_thumbnail(image, geometry, **options):
+    """Готовая миниатюра из KV-хранилища или None.
+
+    Если для поста был вызван prefetch, хранилище не спрашивается.
+    """
+    if not image:
+        return None
+    thumbnail = thumbnail_file(image, geometry, **options)
+    prefetched = getattr(image.instance, '_thumbnails', {})
+    if thumbnail.key in prefetched:
+        return prefetched[thumbnail.key]
+    return default.kvstore.get(thumbnail)
+
+
+def _get_raw_many(raw_keys):
+    """Сырые значения KV-хранилища: один get_many кеша и один запрос."""
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'cache'):
+        return {key: kvstore._get_raw(key) for key in raw_keys}
+    values = kvstore.cache.get_many(raw_keys)
+    missing = [key for key in raw_keys if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(key__in=missing)
+                     .values_list('key', 'value'))
+        fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(fetched,
+                               sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {key: None if value == EMPTY_VALUE else value
+            for key, value in values.items()}
+
+
+@timed('thumbnail')
+def prefetch(posts, geometry=None, **options):
+    """Достаёт готовые миниатюры всех постов страницы одним запросом.
+
+    Результат (включая отсутствие миниатюры) запоминается на постах,
+    и ready_thumbnail для них больше не ходит в хранилище.
+    """
+    if geometry is None:
+        geometry, options = geometries()[0]
+    wanted = {}
+    for post in posts:
+        if post.image:
+            thumbnail = thumbnail_file(post.image, geometry, **options)
+            wanted.setdefault(add_prefix(thumbnail.key), []).append(
+                (post, thumbnail.key))
+    if not wanted:
+        return
+    values = _get_raw_many(list(wanted))
+    for raw_key, targets in wanted.items():
+        value = values.get(raw_key)
+        thumbnail = deserialize_image_file(value) if value else None
+        for post, key in targets:
+            if not hasattr(post, '_thumbnails'):
+                post._thumbnails = {}
+            post._thumbnails[key] = thumbnail
+
+
+@timed('thumbnail')
+def generate(name):
+    """Нарезает все размеры для картинки name; возвращает их число."""
+    made = 0
+    for geometry, options in geometries():
+        get_thumbnail(source(name), geometry, **options)
+        made += 1
+        metrics.inc('yatube_thumbnails_total', result='generated')
+    return made
+
+
+def _fresh(name, thumbnail):
+    """Миниатюра есть в хранилище, в KV и не старше исходника."""
+    if default.kvstore.get(thumbnail) is None or not thumbnail.exists():
+        return False
+    try:
+        return (default.storage.get_modified_time(thumbnail.name)
+                >= source(name).storage.get_modified_time(name))
+    except NotImplementedError:
+        return True
+
+
+def rebuild(name, force=False):
+    """Перерезает устаревшие миниатюры name; False — всё было готово."""
+    stale = [(geometry, options) for geometry, options in geometries()
+             if force or not _fresh(
+                 name, thumbnail_file(source(name), geometry, **options))]
+    for geometry, options in stale:
+        thumbnail = thumbnail_file(source(name), geometry, **options)
+        # sorl не перезаписывает существующий файл, поэтому старый
+        # удаляем вместе с записью в KV.
+        default.kvstore.delete(thumbnail, delete_thumbnails=False)
+        if thumbnail.exists():
+            thumbnail.delete()
+        if not get_thumbnail(source(name), geometry,
+                             **options).exists():
+            metrics.inc('yatube_thumbnails_total', result='failed')
+            raise ThumbnailError(f'Не удалось нарезать {name} {geometry}')
+        metrics.inc('yatube_thumbnails_total', result='generated')
+    return bool(stale)
+
+
+def _process(post, name):
+    try:
+        generate(name)
+    except Exception:
+        metrics.inc('yatube_thumbnails_total', result='failed')
+        logger.exception('Не удалось нарезать миниатюры %s', name)
+        cache.set(_failure_key(name), True,
+                  getattr(settings, 'THUMBNAIL_RETRY_AFTER', 60 * 60))
+        return
+    feed_cache.bump_for_post(post)
+
+
+def _run():
+    while True:
+        post, name = _queue.get()
+        close_old_connections()
+        try:
+            _process(post, name)
+        finally:
+            with _pending_lock:
+                _pending.discard(name)
+            _queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='thumbnails',
+                                       daemon=True)
+            _worker.start()
+
+
+def _submit(post, name):
+    mode = getattr(settings, 'THUMBNAIL_WORKER', 'thread')
+    if mode == 'sync':
+        _process(post, name)
+        return
+    if mode != 'thread':
+        return
+    with _pending_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _ensure_worker()
+    _queue.put((post, name))
+
+
+def enqueue(post):
+    """Ставит картинку поста в очередь после коммита транзакции."""
+    if post.image and not failed_recently(post.image.name):
+        name = post.image.name
+        transaction.on_commit(lambda: _submit(post, name))
+
+
+def wait():
+    """Дожидается, пока фоновый поток разберёт очередь."""
+    _queue.join()
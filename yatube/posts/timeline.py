@@ -0,0 +1,307 @@
+"""Ленты подписок: гибридный fan-out.
+
+Посты обычных авторов раскладываются в ленты подписчиков при записи
+(push), посты «знаменитостей» — авторов, у которых подписчиков не меньше
+TIMELINE_CELEBRITY_THRESHOLD, — подтягиваются при чтении (pull) и
+сливаются с лентой k-way слиянием по pub_date. Когда автор опускается
+ниже порога, catch_up() досыпает подписчикам посты, вышедшие, пока он
+читался через pull, — порциями не больше TIMELINE_CATCH_UP_ROWS
+записей. Пока порции не кончились, автор помечен в кеше и по-прежнему
+читается через pull, а следующие порции досыпает FollowFeed при чтении
+ленты любого из его подписчиков.
+"""
+import heapq
+import logging
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+from core.cache.singleflight import get_or_compute
+
+from .models import Follow, Post, TimelineEntry, UserCounter
+from .utils import LazyRows, keyset_filter
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+CELEBRITY_CACHE_TIMEOUT = 60 * 10
+# Столько живёт фрагмент follow.html и закешированное число постов ленты.
+FOLLOW_CACHE_TIMEOUT = 3
+PATHS = ('push', 'pull', 'hybrid')
+
+FeedItem = namedtuple('FeedItem', 'pub_date pk')
+
+
+def celebrity_threshold():
+    return getattr(settings, 'TIMELINE_CELEBRITY_THRESHOLD', 10000)
+
+
+def _celebrity_key(author_id):
+    return f'timeline:celebrity:{author_id}'
+
+
+def _catch_up_key(author_id):
+    return f'timeline:catch_up:{author_id}'
+
+
+def _count_key(user_id):
+    return f'timeline:count:{user_id}'
+
+
+def catching_up(author_ids):
+    """Авторы, чьи посты ещё не досыпаны в ленты после понижения."""
+    keys = {_catch_up_key(pk): pk for pk in author_ids}
+    return {keys[key] for key, flag in cache.get_many(keys).items() if flag}
+
+
+def celebrities(author_ids):
+    """Возвращает множество авторов, чьи посты читаются через pull."""
+    author_ids = list(author_ids)
+    keys = {_celebrity_key(pk): pk for pk in author_ids}
+    cached = cache.get_many(keys)
+    result = {keys[key] for key, flag in cached.items() if flag}
+    result |= catching_up(author_ids)
+    missing = [pk for key, pk in keys.items() if key not in cached]
+    if not missing:
+        return result
+    followers = dict(UserCounter.objects.filter(user_id__in=missing)
+                     .values_list('user_id', 'followers_count'))
+    threshold = celebrity_threshold()
+    flags = {}
+    for author_id in missing:
+        flag = followers.get(author_id, 0) >= threshold
+        flags[_celebrity_key(author_id)] = flag
+        if flag:
+            result.add(author_id)
+    cache.set_many(flags, CELEBRITY_CACHE_TIMEOUT)
+    return result
+
+
+def forget_celebrity(author_id):
+    """Сбрасывает закешированный статус после подписки или отписки."""
+    cache.delete(_celebrity_key(author_id))
+
+
+def _entry(user_id, post):
+    return TimelineEntry(user_id=user_id,
+                         post_id=post.pk,
+                         author_id=post.author_id,
+                         pub_date=post.pub_date)
+
+
+def fan_out(post):
+    """Кладёт пост в ленты подписчиков, если автор не знаменитость."""
+    if post.author_id in celebrities([post.author_id]):
+        return
+    followers = (Follow.objects.filter(author_id=post.author_id)
+                 .values_list('user_id', flat=True).distinct())
+    TimelineEntry.objects.bulk_create(
+        (_entry(user_id, post) for user_id in followers.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    cache.delete(_count_key(user_id))
+    if author_id in celebrities([author_id]):
+        return
+    limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 1000)
+    posts = (Post.objects.filter(author_id=author_id)
+             .only('pk', 'author_id', 'pub_date')[:limit])
+    TimelineEntry.objects.bulk_create(
+        (_entry(user_id, post) for post in posts),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def catch_up(author_id):
+    """Досыпает подписчикам посты автора новее их последней записи.
+
+    За вызов пишется не больше TIMELINE_CATCH_UP_ROWS записей. Готовым
+    считается подписчик, у которого в ленте есть последний пост автора;
+    пока остались неготовые, автор помечен как догоняющий. Возвращает
+    True, когда досыпать больше некому.
+    """
+    limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 1000)
+    posts = list(Post.objects.filter(author_id=author_id)
+                 .only('pk', 'author_id', 'pub_date')[:limit])
+    if not posts:
+        cache.delete(_catch_up_key(author_id))
+        return True
+    rows = getattr(settings, 'TIMELINE_CATCH_UP_ROWS', 10000)
+    per_call = max(rows // len(posts), 1)
+    ready = (TimelineEntry.objects.filter(post_id=posts[0].pk)
+             .values('user_id'))
+    followers = list(Follow.objects.filter(author_id=author_id)
+                     .exclude(user_id__in=ready).order_by('user_id')
+                     .values_list('user_id', flat=True)[:per_call + 1])
+    done = len(followers) <= per_call
+    followers = followers[:per_call]
+    latest = dict(
+        TimelineEntry.objects
+        .filter(author_id=author_id, user_id__in=followers)
+        .order_by().values('user_id').annotate(latest=Max('pub_date'))
+        .values_list('user_id', 'latest'))
+
+    def missing():
+        for user_id in followers:
+            since = latest.get(user_id)
+            for post in posts:
+                if since is not None and post.pub_date < since:
+                    break
+                yield _entry(user_id, post)
+
+    TimelineEntry.objects.bulk_create(missing(), batch_size=BATCH_SIZE,
+                                      ignore_conflicts=True)
+    if done:
+        cache.delete(_catch_up_key(author_id))
+    else:
+        cache.set(_catch_up_key(author_id), True, None)
+    return done
+
+
+def demote_if_needed(author_id):
+    """Вызывается после отписки: автор мог только что перестать быть
+    знаменитостью, и его посты за время pull надо разложить по лентам."""
+    followers = (UserCounter.objects.filter(user_id=author_id)
+                 .values_list('followers_count', flat=True).first())
+    if followers == celebrity_threshold() - 1:
+        cache.set(_catch_up_key(author_id), True, None)
+        catch_up(author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    cache.delete(_count_key(user_id))
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def record_path(path):
+    """Считает, каким путём собрана лента: push, pull или hybrid."""
+    key = f'timeline:path:{path}'
+    if cache.add(key, 1, None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def path_metrics():
+    """Счётчики путей сборки ленты."""
+    values = cache.get_many([f'timeline:path:{path}' for path in PATHS])
+    return {path: values.get(f'timeline:path:{path}', 0) for path in PATHS}
+
+
+class FollowFeed:
+    """Лента подписок как ленивая последовательность постов.
+
+    Поддерживает срезы и count() для Paginator и keyset() для
+    KeysetPaginator. Потоков не больше двух — записи ленты и посты всех
+    знаменитостей одним запросом; каждый уже упорядочен базой,
+    heapq.merge сливает их, а посты страницы читаются одним in_bulk.
+    Подписки читаются при первом обращении к ленте, срез — при первом
+    чтении страницы, а число постов кешируется на время фрагмента
+    follow.html (подписка и отписка его сбрасывают): фрагмент, отданный
+    из кеша, не стоит ни одного запроса.
+    """
+    ordered = True
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def followed(self):
+        return set(Follow.objects.filter(user=self.user)
+                   .values_list('author_id', flat=True))
+
+    @cached_property
+    def celebrities(self):
+        return sorted(celebrities(self.followed))
+
+    @cached_property
+    def path(self):
+        if not self.celebrities:
+            return 'push'
+        if len(self.celebrities) == len(self.followed):
+            return 'pull'
+        return 'hybrid'
+
+    @cached_property
+    def streams(self):
+        # Догоняющие авторы уже читаются через pull; здесь — следующая порция.
+        for author_id in catching_up(self.celebrities):
+            catch_up(author_id)
+        record_path(self.path)
+        logger.info('follow feed path=%s user=%s celebrities=%d',
+                    self.path, self.user.pk, len(self.celebrities))
+        streams = [
+            (TimelineEntry.objects.filter(user=self.user)
+             .exclude(author_id__in=self.celebrities)
+             .values_list('pub_date', 'post_id'), 'post_id'),
+        ]
+        if self.celebrities:
+            streams.append(
+                (Post.objects.filter(author_id__in=self.celebrities)
+                 .values_list('pub_date', 'pk'), 'pk'))
+        return streams
+
+    def _count(self):
+        # Оба потока считаются одним запросом: COUNT(*) по UNION ALL.
+        first, *rest = [qs.order_by() for qs, _ in self.streams]
+        if rest:
+            first = first.union(*rest, all=True)
+        return first.count()
+
+    @cached_property
+    def _total(self):
+        return get_or_compute(_count_key(self.user.pk),
+                              self._count, FOLLOW_CACHE_TIMEOUT)
+
+    def count(self):
+        return self._total
+
+    def __len__(self):
+        return self.count()
+
+    @staticmethod
+    def _stream(queryset, pk_field, key, backward, limit):
+        rows = keyset_filter(queryset, key, backward, pk_field)[:limit]
+        return (FeedItem(*row) for row in rows)
+
+    def _merge(self, key, backward, limit):
+        # Каждый поток читается одним запросом не больше чем на limit
+        # записей: потоков два, так что база отдаёт не больше 2 * limit.
+        runs = [self._stream(qs, pk_field, key, backward, limit)
+                for qs, pk_field in self.streams]
+        merged = heapq.merge(*runs, reverse=not backward)
+        return list(islice(merged, limit))
+
+    @staticmethod
+    def _posts(items):
+        ids = [item.pk for item in items]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        return LazyRows(
+            lambda: self._posts(self._merge(None, False, stop)[start:]))
+
+    def keyset(self, key, backward, limit):
+        return self._posts(self._merge(key, backward, limit))
+
+
+def feed_for(user):
+    """Лента пользователя; путь учитывается при первом чтении ленты."""
+    return FollowFeed(user)
@@ -6,6 +6,7 @@ app_name = 'Posts'
 urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('search/', views.search, name='search'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
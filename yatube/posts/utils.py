@@ -1,8 +1,221 @@
-from django.core.paginator import Paginator
+import base64
+import json
 
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
-def my_paginator(request, posts):
-    paginator = Paginator(posts, 10)
+from core.cache.singleflight import get_or_compute
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 50
+
+
+def pack_cursor(*values):
+    """Упаковывает значения ключа сортировки в непрозрачную строку."""
+    raw = json.dumps(values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def unpack_cursor(cursor):
+    """Распаковывает курсор в список значений; для битого — None."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        values = json.loads(raw)
+    except (TypeError, ValueError, UnicodeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def encode_cursor(pub_date, pk, backward=False):
+    """Упаковывает ключ (pub_date, id) в непрозрачную строку."""
+    return pack_cursor(pub_date.isoformat(), pk, int(backward))
+
+
+def decode_cursor(cursor):
+    """Распаковывает курсор. Для битого курсора возвращает None."""
+    try:
+        pub_date, pk, backward = unpack_cursor(cursor)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk, bool(backward)
+
+
+class LazyRows:
+    """Список, который строится load() при первом обращении к нему."""
+
+    def __init__(self, load):
+        self._load = load
+
+    @cached_property
+    def _rows(self):
+        return list(self._load())
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        return self._rows[index]
+
+
+class KeysetPage(Page):
+    """Страница курсорной пагинации, совместимая с шаблоном page_obj."""
+    is_keyset = True
+
+    def __init__(self, object_list, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Keyset page of %s>' % len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class LazyKeysetPage(KeysetPage):
+    """KeysetPage, которая выбирает строки при первом обращении к ним
+    или к курсорам. Фрагмент шаблона, отданный из кеша, запроса не стоит.
+
+    load() возвращает (object_list, next_cursor, previous_cursor).
+    """
+
+    def __init__(self, paginator, load):
+        self.paginator = paginator
+        self.number = None
+        self._load = load
+
+    @cached_property
+    def _loaded(self):
+        return list(self._load())
+
+    @property
+    def object_list(self):
+        return self._loaded[0]
+
+    @object_list.setter
+    def object_list(self, rows):
+        self._loaded[0] = rows
+
+    @property
+    def next_cursor(self):
+        return self._loaded[1]
+
+    @property
+    def previous_cursor(self):
+        return self._loaded[2]
+
+
+def keyset_filter(queryset, key=None, backward=False, pk_field='pk'):
+    """Упорядочивает выборку по (pub_date, id) и отсекает всё до курсора.
+
+    При backward=True выборка идёт от курсора к более новым записям.
+    """
+    if backward:
+        queryset = queryset.order_by('pub_date', pk_field)
+    else:
+        queryset = queryset.order_by('-pub_date', '-' + pk_field)
+    if key is None:
+        return queryset
+    pub_date, pk = key
+    lookup = 'gt' if backward else 'lt'
+    return queryset.filter(
+        Q(**{'pub_date__' + lookup: pub_date})
+        | Q(pub_date=pub_date, **{pk_field + '__' + lookup: pk})
+    )
+
+
+class KeysetPaginator(Paginator):
+    """Пагинация по (pub_date, id) без OFFSET и COUNT(*).
+
+    Вместо QuerySet можно передать объект с методом
+    keyset(key, backward, limit), который сам выбирает строки.
+    """
+
+    def get_page(self, cursor):
+        return LazyKeysetPage(self, lambda: self._load(cursor))
+
+    def _load(self, cursor):
+        key = decode_cursor(cursor) if cursor else None
+        if key is None:
+            rows = self._fetch(None, False)
+            return self._build(rows[:self.per_page],
+                               len(rows) > self.per_page, False)
+        pub_date, pk, backward = key
+        rows = self._fetch((pub_date, pk), backward)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backward:
+            # Выборка шла к более новым постам, разворачиваем её.
+            return self._build(rows[::-1], True, has_more)
+        return self._build(rows, has_more, True)
+
+    def _fetch(self, key, backward):
+        limit = self.per_page + 1
+        if hasattr(self.object_list, 'keyset'):
+            return self.object_list.keyset(key, backward, limit)
+        return list(keyset_filter(self.object_list, key, backward)[:limit])
+
+    def _build(self, rows, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            last = rows[-1]
+            next_cursor = encode_cursor(last.pub_date, last.pk)
+        if rows and has_previous:
+            first = rows[0]
+            previous_cursor = encode_cursor(
+                first.pub_date, first.pk, backward=True)
+        return rows, next_cursor, previous_cursor
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, у которого COUNT(*) кешируется и считается одним
+    запросом даже при одновременном промахе кеша."""
+
+    def __init__(self, object_list, per_page, count_key, timeout):
+        super().__init__(object_list, per_page)
+        self.count_key = count_key
+        self.timeout = timeout
+
+    @cached_property
+    def count(self):
+        return get_or_compute(self.count_key,
+                              lambda: Paginator.count.func(self),
+                              self.timeout)
+
+
+def my_paginator(request, posts, mode=None, count_key=None):
+    """Пагинирует посты по номеру страницы или по курсору.
+
+    Курсорный режим включается настройкой POSTS_PAGINATION='keyset'
+    или параметром ?cursor= в запросе. С count_key число постов
+    берётся из кеша.
+    """
+    mode = mode or getattr(settings, 'POSTS_PAGINATION', 'offset')
+    cursor = request.GET.get('cursor')
+    if mode == 'keyset' or cursor is not None:
+        return KeysetPaginator(posts, POSTS_PER_PAGE).get_page(cursor)
+    if count_key is not None:
+        timeout = getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60)
+        paginator = CachedCountPaginator(posts, POSTS_PER_PAGE,
+                                         count_key, timeout)
+    else:
+        paginator = Paginator(posts, POSTS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
@@ -1,56 +1,87 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Post, Group, User
+from .models import Comment, Follow, Post, User
 from django.contrib.auth.decorators import login_required
-from .utils import my_paginator
+from .counters import user_counter
+from .feed_cache import count_key, feed_cache_context
+from .hot_objects import group_by_slug, user_by_username
+from . import follows, thumbnails
+from .search import SearchPaginator
+from .timeline import FOLLOW_CACHE_TIMEOUT, feed_for
+from .utils import (COMMENTS_PER_PAGE, POSTS_PER_PAGE, KeysetPaginator,
+                    my_paginator)
 
 
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.select_related('author').all()
-    page_obj = my_paginator(request, posts)
+    posts = Post.objects.select_related('author', 'group').all()
+    page_obj = my_paginator(request, posts, count_key=count_key('index'))
     context = {
         'page_obj': page_obj,
         'posts': posts,
-        'title': 'whatsapp'}
+        'title': 'whatsapp',
+        **feed_cache_context(request, 'index')}
     return render(request, template, context)
 
 
 def group_posts(request, slug):
-    grouper = get_object_or_404(Group, slug=slug)
-    posts = grouper.groups.all().select_related('group')
-    page_obj = my_paginator(request, posts)
+    grouper = group_by_slug(slug)
+    posts = grouper.groups.all().select_related('author', 'group')
+    page_obj = my_paginator(request, posts,
+                            count_key=count_key('group', grouper.pk))
     context = {
         'page_obj': page_obj,
         'group': grouper,
-        'posts': posts}
+        'posts': posts,
+        **feed_cache_context(request, 'group', grouper.pk)}
     return render(request, 'posts/group_list.html', context)
 
 
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = SearchPaginator(query, POSTS_PER_PAGE).get_page(
+        request.GET.get('cursor'))
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+    }
+    return render(request, template, context)
+
+
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('author').all()
-    posts_counter = posts.count()
-    page_obj = my_paginator(request, posts)
-    follows = Follow.objects.filter(
+    author = user_by_username(username)
+    posts = author.posts.select_related('author', 'group').all()
+    counter = user_counter(author)
+    page_obj = my_paginator(request, posts,
+                            count_key=count_key('profile', author.pk))
+    following = Follow.objects.filter(
         user=request.user.pk
     ).filter(author=author).exists()
     context = {
         'page_obj': page_obj,
-        'posts_counter': posts_counter,
+        'posts_counter': counter.posts_count,
+        'counter': counter,
         'author': author,
-        'following': follows,
+        'following': following,
+        **feed_cache_context(request, 'profile', author.pk),
     }
     return render(request, template, context)
 
 
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    cnt = Post.objects.filter(author=post.author).count()
-    comments = Comment.objects.filter(post_id=post_id)
-    form = CommentForm(request.POST)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counter', 'group'), pk=post_id)
+    cnt = user_counter(post.author).posts_count
+    # Курсорная пагинация: ни OFFSET, ни COUNT(*) — число комментариев
+    # уже есть в post.comments_count, авторы приходят тем же запросом.
+    comments = KeysetPaginator(
+        Comment.objects.filter(post_id=post.pk).select_related('author'),
+        COMMENTS_PER_PAGE,
+    ).get_page(request.GET.get('comments'))
+    form = CommentForm(request.POST or None)
     if request.method == 'POST' and form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -77,6 +108,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             form.save()
+            thumbnails.enqueue(post)
             return redirect("posts:profile", request.user)
     form = PostForm(request.POST,
                     files=request.FILES,
@@ -99,6 +131,8 @@ def post_edit(request, post_id):
                     )
     if form.is_valid() and request.method == 'POST':
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
@@ -122,12 +156,10 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.select_related(
-        'author').filter(
-            author__following__user=request.user)
-    page_obj = my_paginator(request, posts)
+    page_obj = my_paginator(request, feed_for(request.user))
     context = {
         'page_obj': page_obj,
+        'feed_timeout': FOLLOW_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
@@ -135,16 +167,12 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if request.user != author:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author,
-        )
+    follows.follow(request.user, [author])
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(author=author.id).delete()
+    follows.unfollow(request.user, [author])
     return redirect('posts:profile', username)
@@ -50,11 +50,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым: планы и запись журнала не попадают в чужие счётчики SQL
+    'core.slowlog.SlowQueryMiddleware',
+    'core.timing.ServerTimingMiddleware',
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.querycount.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -63,7 +69,7 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -141,9 +147,108 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Раздачу MEDIA_URL после проверки отдаёт фронтенду: 'nginx'
+# (X-Accel-Redirect на MEDIA_ACCEL_PREFIX), 'sendfile' (X-Sendfile)
+# или None — FileResponse с Range и ETag из самого Django
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.layered.LayeredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_TIMEOUT': 5,
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_EXCLUDE': ('lock:', 'timeline:path:'),
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
     }
 }
+
+# Тесты идут с кешем в памяти и без фоновых миниатюр (core.testing)
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# 'offset' — ?page=N, 'keyset' — курсор по (pub_date, id) без COUNT(*)
+POSTS_PAGINATION = 'offset'
+
+# Сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL_LIMIT = 1000
+# С какого числа подписчиков посты автора читаются через pull, а не push
+TIMELINE_CELEBRITY_THRESHOLD = 10000
+# Сколько записей ленты досыпается за раз, когда автор опускается ниже
+# порога; остальное — следующими чтениями лент его подписчиков
+TIMELINE_CATCH_UP_ROWS = 10000
+
+# Кеш фрагментов лент сбрасывается сигналами, поэтому TTL большой
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# 'auto' — FTS5, если SQLite его поддерживает, иначе обратный индекс;
+# 'fts5' или 'index' — выбрать явно
+SEARCH_BACKEND = 'auto'
+
+# Размеры миниатюр постов, которые нарезаются заранее
+POST_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# 'thread' — фоновый поток, 'sync' — прямо в запросе, 'off' — не резать
+THUMBNAIL_WORKER = 'thread'
+# Через сколько секунд снова пробовать картинку, которую не удалось нарезать
+THUMBNAIL_RETRY_AFTER = 60 * 60
+
+# Загруженные картинки постов: не больше POST_IMAGE_MAX_SIZE точек,
+# без EXIF, в 'JPEG' (прогрессивный) или 'WEBP' с этим качеством
+POST_IMAGE_MAX_SIZE = (2560, 2560)
+POST_IMAGE_FORMAT = 'JPEG'
+POST_IMAGE_QUALITY = 85
+
+# Счётчик SQL-запросов на запрос: бюджет по имени URL, N+1 — форма
+# запроса, повторившаяся QUERY_BUDGET_REPEATS раз. Нарушения пишутся в
+# лог, а с QUERY_BUDGET_STRICT превращаются в исключение
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_STRICT = False
+QUERY_BUDGET_REPEATS = 3
+QUERY_BUDGET_DEFAULT = 20
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_list': 7,
+    'posts:profile': 9,
+    'posts:post_detail': 6,
+    'posts:follow_index': 8,
+    'posts:search': 6,
+}
+
+# Доля запросов, для которых считается время фаз (SQL, кеш, шаблон,
+# миниатюры) и отдаётся заголовок Server-Timing; 0 — выключено
+SERVER_TIMING_SAMPLE_RATE = 1.0 if DEBUG else 0.05
+
+# /metrics: кому отдавать (адреса и сети) и токен для заголовка
+# Authorization: Bearer. По умолчанию закрыто: за nginx у всех запросов
+# REMOTE_ADDR 127.0.0.1, так что адрес прокси в список не добавлять.
+# Несколько воркеров складывают метрики через файлы в METRICS_DIR;
+# None — счётчики у каждого процесса свои, и /metrics показывает только
+# тот воркер, который ответил
+METRICS_ALLOWED_IPS = ()
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+# Профилирование запросов персонала: по подписанному токену
+# (?_profile= или X-Profile) или случайно с долей PROFILING_SAMPLE_RATE;
+# 'cprofile' — .pstats, 'sample' — стеки в формате collapsed
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_MODE = 'cprofile'
+PROFILING_SAMPLE_RATE = 0
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# Запросы дольше стольких миллисекунд пишутся с планом в SlowQuery
+# (manage.py slow_queries); None — журнал выключен
+SLOW_QUERY_THRESHOLD_MS = 100
@@ -1,8 +1,9 @@
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.contrib.auth.views import LogoutView
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core import media, metrics
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
@@ -17,9 +18,7 @@ urlpatterns = [
          LogoutView.as_view(
              template_name='users/logged_out.html'), name='logout'),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', metrics.view, name='metrics'),
+    re_path(r'^{}(?P<path>.+)$'.format(settings.MEDIA_URL.lstrip('/')),
+            media.serve, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )